@@ -0,0 +1,393 @@
+# In-memory stand-ins for Supabase, shared by the benchmarks and the load simulator
+import asyncio
+import itertools
+import json
+import sys
+import threading
+import types
+from typing import Callable, Optional
+from urllib.parse import parse_qsl
+
+import httpx
+
+# Primary keys the store fills in when a row arrives without one
+ID_COLUMNS = {"user_accounts": "user_id", "node": "node_id", "devices": "device_id", "network_logs": "log_id"}
+
+
+def _coerce(raw: str, sample):
+    """Filter values arrive as strings; compare them as the column's type"""
+    if isinstance(sample, bool):
+        return raw.lower() == "true"
+    if isinstance(sample, (int, float)):
+        try:
+            return float(raw)
+        except ValueError:
+            return raw
+    return raw
+
+
+def _matches(row: dict, column: str, op: str, raw) -> bool:
+    if op == "or":
+        # raw is a list of alternatives, each a list of ANDed filters
+        return any(all(_matches(row, *f) for f in group) for group in raw)
+    value = row.get(column)
+    if op == "in":
+        return str(value) in {str(v) for v in raw}
+    if op == "is":
+        return value is None if raw == "null" else str(value).lower() == raw
+    if value is None:
+        return False
+    other = _coerce(raw, value) if isinstance(raw, str) else raw
+    if isinstance(value, (int, float)) and isinstance(other, str):
+        value = str(value)
+    return {
+        "eq": lambda: value == other,
+        "neq": lambda: value != other,
+        "gt": lambda: value > other,
+        "gte": lambda: value >= other,
+        "lt": lambda: value < other,
+        "lte": lambda: value <= other,
+    }[op]()
+
+
+class FakeStore:
+    """Tables as lists of dicts, plus RPC handlers and insert hooks"""
+
+    def __init__(self):
+        self.tables: dict = {}
+        self.rpc_handlers: dict = {
+            "register_user_device": self._register_user_device,
+            "dashboard_node_summary": self._dashboard_node_summary,
+        }
+        self.insert_hooks: list = []   # called with (table, rows) after every insert
+        # (table, conflict columns) -> (table list, rows indexed, {key tuple: row}) for upserts
+        self._indexes: dict = {}
+        self.calls = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def table(self, name: str) -> list:
+        return self.tables.setdefault(name, [])
+
+    def seed_nodes(self, count: int, mac_prefix: str = "24:6F:28") -> list:
+        """`count` nodes with MACs under one OUI, like a fresh ESP32 batch"""
+        nodes = [
+            {"node_id": i, "mac_address": f"{mac_prefix}:{i >> 16 & 255:02X}:{i >> 8 & 255:02X}:{i & 255:02X}", "status": "inactive"}
+            for i in range(1, count + 1)
+        ]
+        self.table("node").extend(nodes)
+        return nodes
+
+    def seed_user(self, username: str, password_hash: str, role: str = "admin", node_id: Optional[int] = None):
+        self.insert("user_accounts", [{"username": username, "password_hash": password_hash, "role": role, "node_id": node_id}])
+
+    def _conflict_index(self, name: str, keys: tuple) -> dict:
+        """Rows by their conflict-key tuple, caught up with rows appended since; caller holds the lock"""
+        table = self.table(name)
+        cached = self._indexes.get((name, keys))
+        if cached is None or cached[0] is not table or cached[1] > len(table):
+            # New, or the table was replaced (delete)
+            cached = (table, 0, {})
+        _, indexed, index = cached
+        for row in table[indexed:]:
+            index.setdefault(tuple(row.get(k) for k in keys), row)
+        self._indexes[(name, keys)] = (table, len(table), index)
+        return index
+
+    def _drop_indexes(self, name: str):
+        for key in [key for key in self._indexes if key[0] == name]:
+            del self._indexes[key]
+
+    # ======== OPERATIONS =========
+
+    def select(self, name: str, filters: list, order: Optional[tuple] = None, limit: Optional[int] = None, offset: int = 0) -> list:
+        with self._lock:
+            self.calls += 1
+            rows = [dict(r) for r in self.table(name) if all(_matches(r, *f) for f in filters)]
+        for column, desc in reversed(order or []):
+            rows.sort(key=lambda r: (r.get(column) is None, r.get(column)), reverse=desc)
+        rows = rows[offset:]
+        return rows[:limit] if limit is not None else rows
+
+    def insert(self, name: str, rows: list, on_conflict: Optional[str] = None, ignore_duplicates: bool = False) -> list:
+        keys = tuple(on_conflict.split(",")) if on_conflict else None
+        stored = []
+        with self._lock:
+            self.calls += 1
+            table = self.table(name)
+            index = self._conflict_index(name, keys) if keys else None
+            for row in rows:
+                row = dict(row)
+                id_column = ID_COLUMNS.get(name)
+                if id_column and row.get(id_column) is None:
+                    row[id_column] = next(self._ids)
+                if keys:
+                    key = tuple(row.get(k) for k in keys)
+                    existing = index.get(key)
+                    if existing is not None:
+                        if not ignore_duplicates:
+                            # Same key values, so the index entry stays valid
+                            existing.update(row)
+                        continue
+                    index[key] = row
+                table.append(row)
+                stored.append(row)
+            if keys:
+                self._indexes[(name, keys)] = (table, len(table), index)
+        for hook in self.insert_hooks:
+            hook(name, stored)
+        return stored
+
+    def update(self, name: str, filters: list, values: dict) -> list:
+        with self._lock:
+            self.calls += 1
+            matched = [r for r in self.table(name) if all(_matches(r, *f) for f in filters)]
+            for row in matched:
+                row.update(values)
+            if matched:
+                self._drop_indexes(name)
+        return matched
+
+    def delete(self, name: str, filters: list) -> list:
+        with self._lock:
+            self.calls += 1
+            table = self.table(name)
+            removed = [r for r in table if all(_matches(r, *f) for f in filters)]
+            removed_ids = {id(r) for r in removed}
+            self.tables[name] = [r for r in table if id(r) not in removed_ids]
+        return removed
+
+    def rpc(self, function: str, params: dict):
+        return self.rpc_handlers[function](params)
+
+    def _register_user_device(self, params: dict):
+        if any(u["username"] == params["p_username"] for u in self.table("user_accounts")):
+            raise FakeConflict('duplicate key value violates unique constraint "user_accounts_username_key"')
+        user = self.insert("user_accounts", [{
+            "username": params["p_username"], "password_hash": params["p_password_hash"],
+            "role": "user", "node_id": params["p_node_id"],
+        }])[0]
+        self.insert("devices", [{"user_id": user["user_id"], "node_id": params["p_node_id"], "mac_address": params["p_mac_address"]}])
+        return user["user_id"]
+
+
+    def _dashboard_node_summary(self, params: dict) -> list:
+        rows = self.select("performance_metrics", [
+            ("metric_timestamp", "gte", params["p_start"]), ("metric_timestamp", "lt", params["p_end"]),
+        ], order=[("metric_timestamp", True)])
+        by_node: dict = {}
+        for row in rows:
+            by_node.setdefault(row["node_id"], []).append(row)
+
+        def p95(values):
+            values = sorted(v for v in values if v is not None)
+            return values[max(0, -(-95 * len(values) // 100) - 1)] if values else None
+
+        def avg(values):
+            values = [v for v in values if v is not None]
+            return sum(values) / len(values) if values else None
+
+        return [{
+            "node_id": node_id, "samples": len(group), "last_seen": group[0]["metric_timestamp"],
+            "signal_strength": group[0].get("signal_strength"), "latency": group[0].get("latency"),
+            "data_usage": group[0].get("data_usage"),
+            "latency_avg": avg(r.get("latency") for r in group), "latency_p95": p95(r.get("latency") for r in group),
+            "signal_avg": avg(r.get("signal_strength") for r in group),
+            "signal_p95": p95(r.get("signal_strength") for r in group),
+        } for node_id, group in sorted(by_node.items())]
+
+
+class FakeConflict(Exception):
+    """Unique violation; the transport answers it with 409 like PostgREST"""
+
+
+# ======== supabase-py CLIENT =========
+
+class _Result:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """The slice of postgrest-py's builder this backend uses"""
+
+    def __init__(self, store: FakeStore, name: str):
+        self.store = store
+        self.name = name
+        self._op = "select"
+        self._filters: list = []
+        self._order: list = []
+        self._limit: Optional[int] = None
+        self._payload = None
+        self._on_conflict: Optional[str] = None
+        self._ignore_duplicates = False
+
+    def select(self, *columns, **kwargs):
+        self._op = "select"
+        return self
+
+    def _filter(self, op: str, column: str, value):
+        self._filters.append((column, op, value if op == "in" else str(value)))
+        return self
+
+    def eq(self, column, value): return self._filter("eq", column, value)
+    def neq(self, column, value): return self._filter("neq", column, value)
+    def gt(self, column, value): return self._filter("gt", column, value)
+    def gte(self, column, value): return self._filter("gte", column, value)
+    def lt(self, column, value): return self._filter("lt", column, value)
+    def lte(self, column, value): return self._filter("lte", column, value)
+    def in_(self, column, values): return self._filter("in", column, list(values))
+
+    def order(self, column, desc: bool = False):
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, count: int):
+        self._limit = count
+        return self
+
+    def insert(self, rows, **kwargs):
+        self._op, self._payload = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def upsert(self, rows, on_conflict: Optional[str] = None, ignore_duplicates: bool = False, **kwargs):
+        self.insert(rows)
+        self._on_conflict, self._ignore_duplicates = on_conflict, ignore_duplicates
+        return self
+
+    def update(self, values: dict):
+        self._op, self._payload = "update", values
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def execute(self) -> _Result:
+        if self._op == "select":
+            return _Result(self.store.select(self.name, self._filters, self._order, self._limit))
+        if self._op == "insert":
+            return _Result(self.store.insert(self.name, self._payload, self._on_conflict, self._ignore_duplicates))
+        if self._op == "update":
+            return _Result(self.store.update(self.name, self._filters, self._payload))
+        return _Result(self.store.delete(self.name, self._filters))
+
+
+class FakeSupabase:
+    def __init__(self, store: FakeStore):
+        self.store = store
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self.store, name)
+
+
+def install_fake_supabase(store: FakeStore) -> FakeSupabase:
+    """Make services.supabase_client.get_supabase() return the fake.
+
+    Call before anything imports services.supabase_client.
+    """
+    client = FakeSupabase(store)
+    module = types.ModuleType("services.supabase_client")
+    module.get_supabase = lambda: client
+    sys.modules["services.supabase_client"] = module
+    return client
+
+
+# ======== PostgREST over httpx (for services.db) =========
+
+def _split_top_level(expression: str) -> list:
+    """Split "a,b(c,d),e" on the commas outside parentheses"""
+    parts, depth, current = [], 0, ""
+    for char in expression:
+        if char == "," and depth == 0:
+            parts.append(current)
+            current = ""
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current += char
+    return parts + [current] if current else parts
+
+
+def _parse_filter(column: str, expression: str) -> list:
+    if column in ("and", "or"):
+        parts = _split_top_level(expression[1:-1])
+        groups = []
+        for part in parts:
+            if part.startswith(("and(", "or(")):
+                name, _, rest = part.partition("(")
+                groups.append(_parse_filter(name, "(" + rest))
+            else:
+                groups.append(_parse_filter(*part.split(".", 1)))
+        if column == "or":
+            return [(None, "or", groups)]
+        return [f for group in groups for f in group]
+    op, _, value = expression.partition(".")
+    if op == "in":
+        return [(column, "in", [v.strip('"') for v in value.strip("()").split(",") if v])]
+    return [(column, op, value.strip('"'))]
+
+
+def postgrest_transport(store: FakeStore, latency: float = 0.0) -> httpx.MockTransport:
+    """MockTransport answering services.db's REST calls from the store.
+
+    `latency` adds a fixed delay per request to mimic a network hop.
+    """
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if latency:
+            await asyncio.sleep(latency)
+        path = request.url.path.split("/rest/v1/", 1)[-1]
+        params = parse_qsl(request.url.query.decode())
+        body = json.loads(request.content) if request.content else None
+
+        if path.startswith("rpc/"):
+            try:
+                return httpx.Response(200, json=store.rpc(path[4:], body or {}))
+            except FakeConflict as e:
+                return httpx.Response(409, json={"code": "23505", "message": str(e)})
+
+        filters, order, limit, offset, on_conflict = [], [], None, 0, None
+        for key, value in params:
+            if key == "select":
+                continue
+            elif key == "order":
+                order = [(c.split(".")[0], c.endswith(".desc")) for c in value.split(",")]
+            elif key == "limit":
+                limit = int(value)
+            elif key == "offset":
+                offset = int(value)
+            elif key == "on_conflict":
+                on_conflict = value
+            else:
+                filters.extend(_parse_filter(key, value))
+
+        if request.method == "GET":
+            return httpx.Response(200, json=store.select(path, filters, order, limit, offset))
+        if request.method == "POST":
+            rows = body if isinstance(body, list) else [body]
+            prefer = request.headers.get("prefer", "")
+            stored = store.insert(path, rows, on_conflict, "ignore-duplicates" in prefer)
+            return httpx.Response(201, json=stored if "representation" in prefer else None)
+        if request.method == "PATCH":
+            store.update(path, filters, body)
+            return httpx.Response(204)
+        if request.method == "DELETE":
+            removed = store.delete(path, filters)
+            return httpx.Response(204, headers={"content-range": f"*/{len(removed)}"})
+        return httpx.Response(405)
+
+    return httpx.MockTransport(handler)
+
+
+def install_fake_db(store: FakeStore, latency: float = 0.0):
+    """Point the shared async DAO at the store"""
+    from services.db import db
+    db._url, db._key = "http://fake-supabase.local", "fake-key"
+    db._transport = postgrest_transport(store, latency)
+    db._http = None
+    return db
+
+
+def on_insert(store: FakeStore, table: str, callback: Callable[[list], None]):
+    store.insert_hooks.append(lambda name, rows: callback(rows) if name == table else None)
@@ -0,0 +1,117 @@
+# Timing, allocation and baseline helpers for the benchmark suite
+import asyncio
+import gc
+import json
+import math
+import time
+import tracemalloc
+from typing import Callable, Optional
+
+
+_loop = asyncio.new_event_loop()
+
+
+def percentile(sorted_values: list, q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def _call(fn: Callable):
+    result = fn()
+    if asyncio.iscoroutine(result):
+        return _loop.run_until_complete(result)
+    return result
+
+
+def measure(name: str, fn: Callable, iterations: int, warmup: int = 0, alloc_iterations: Optional[int] = None) -> dict:
+    """Time `fn` per call, then count its allocations in a separate pass.
+
+    tracemalloc slows every allocation down, so it never runs during the
+    timed loop. `fn` may return a coroutine; it is run to completion.
+    """
+    for _ in range(warmup):
+        _call(fn)
+
+    gc.collect()
+    gc.disable()
+    try:
+        timings = []
+        started = time.perf_counter()
+        for _ in range(iterations):
+            t0 = time.perf_counter_ns()
+            _call(fn)
+            timings.append(time.perf_counter_ns() - t0)
+        elapsed = time.perf_counter() - started
+    finally:
+        gc.enable()
+
+    alloc_iterations = alloc_iterations or min(iterations, 1000)
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    for _ in range(alloc_iterations):
+        _call(fn)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    diff = after.compare_to(before, "filename")
+    allocated = sum(max(stat.size_diff, 0) for stat in diff)
+    blocks = sum(max(stat.count_diff, 0) for stat in diff)
+
+    timings.sort()
+    return {
+        "name": name,
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / elapsed, 1) if elapsed else 0.0,
+        "p50_us": round(percentile(timings, 50) / 1000, 2),
+        "p95_us": round(percentile(timings, 95) / 1000, 2),
+        "p99_us": round(percentile(timings, 99) / 1000, 2),
+        "max_us": round(timings[-1] / 1000, 2),
+        # Net of what was freed again, i.e. retained per call
+        "bytes_per_call": round(allocated / alloc_iterations, 1),
+        "blocks_per_call": round(blocks / alloc_iterations, 2),
+    }
+
+
+def print_table(results: list):
+    header = f"{'benchmark':<32}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}{'B/call':>10}{'blk/call':>10}"
+    print(header)
+    print("-" * len(header))
+    for r in results:
+        print(
+            f"{r['name']:<32}{r['ops_per_sec']:>12,.0f}{r['p50_us']:>10}{r['p95_us']:>10}"
+            f"{r['p99_us']:>10}{r['bytes_per_call']:>10}{r['blocks_per_call']:>10}"
+        )
+
+
+def save_baseline(path: str, results: list, meta: dict):
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": {r["name"]: r for r in results}}, f, indent=2)
+
+
+def compare(path: str, results: list, threshold: float) -> list:
+    """Print deltas against a saved baseline; returns the regressed benchmarks.
+
+    A benchmark regresses when its p50 grows, or its throughput drops, by
+    more than `threshold` (0.15 = 15%).
+    """
+    with open(path) as f:
+        baseline = json.load(f)["results"]
+
+    regressions = []
+    print(f"\n{'benchmark':<32}{'ops/s':>12}{'Δ':>9}{'p50 us':>10}{'Δ':>9}")
+    for r in results:
+        old = baseline.get(r["name"])
+        if not old:
+            print(f"{r['name']:<32}{'(new)':>12}")
+            continue
+        ops_delta = r["ops_per_sec"] / old["ops_per_sec"] - 1 if old["ops_per_sec"] else 0.0
+        p50_delta = r["p50_us"] / old["p50_us"] - 1 if old["p50_us"] else 0.0
+        regressed = p50_delta > threshold or ops_delta < -threshold
+        if regressed:
+            regressions.append(r["name"])
+        print(
+            f"{r['name']:<32}{r['ops_per_sec']:>12,.0f}{ops_delta:>+9.1%}{r['p50_us']:>10}{p50_delta:>+9.1%}"
+            f"{'  REGRESSED' if regressed else ''}"
+        )
+    return regressions
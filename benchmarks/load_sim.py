@@ -0,0 +1,290 @@
+"""End-to-end load simulator: virtual ESP nodes against a local broker.
+
+    mosquitto -p 1883 &
+    python -m benchmarks.load_sim --nodes 5000 --connections 20 --telemetry-interval 5 --duration 120
+
+The backend runs in this process (the FastAPI app under uvicorn, whose
+lifespan starts the MQTT listener) with Supabase replaced by benchmarks.fakes, so "stored" means the
+row reached the fake performance_metrics table. Virtual nodes are spread
+over a few paho connections and publish nodewave/registration heartbeats and
+/mesh/backend telemetry; an HTTP driver hits /login, /dashboard and
+/send-command at the same time.
+
+Reports ingest lag (publish -> row stored), HTTP p50/p99 per endpoint and
+drop counts; --json writes the same numbers to a file.
+"""
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+
+
+def configure_env(args):
+    """Must run before any backend module is imported"""
+    os.environ.update({
+        "SUPABASE_URL": "http://fake-supabase.local",
+        "SUPABASE_KEY": "fake-key",
+        "MQTT_BROKER": args.broker,
+        "MQTT_PORT": str(args.port),
+        "MQTT_TLS": "false",
+        "MQTT_USERNAME": os.getenv("MQTT_USERNAME", "loadsim"),
+        "MQTT_PASSWORD": os.getenv("MQTT_PASSWORD", "loadsim"),
+        "INGEST_USE_SPOOL": "true" if args.spool else "false",
+        "SPOOL_PATH": os.getenv("SPOOL_PATH", "/tmp/nodewave-loadsim-spool.db"),
+        "LEADER_LOCK_PATH": "/tmp/nodewave-loadsim-leader.lock",
+        "MAINTENANCE_LOCK_PATH": "/tmp/nodewave-loadsim-maintenance.lock",
+    })
+    os.environ.setdefault("JWT_SECRET_KEY", "loadsim-secret")
+
+
+def percentiles(values: list) -> dict:
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def at(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 2)
+    return {"count": len(ordered), "p50_ms": at(0.50), "p95_ms": at(0.95), "p99_ms": at(0.99), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+# ======== VIRTUAL NODES =========
+
+class NodeFleet:
+    """N virtual nodes multiplexed over K MQTT connections.
+
+    Each connection has one scheduler thread that publishes for its nodes in
+    due-time order, so thousands of nodes cost K sockets and K threads.
+    """
+
+    def __init__(self, macs: list, args):
+        import paho.mqtt.client as mqtt
+
+        self.args = args
+        self.stats = Counter()
+        self._stop = threading.Event()
+        self._threads = []
+        self.clients = []
+        for i in range(args.connections):
+            client = mqtt.Client(client_id=f"loadsim-{os.getpid()}-{i}")
+            client.username_pw_set(os.environ["MQTT_USERNAME"], os.environ["MQTT_PASSWORD"])
+            client.connect(args.broker, args.port, keepalive=60)
+            client.loop_start()
+            self.clients.append((client, macs[i::args.connections]))
+
+    def _payload(self, mac: str, rng: random.Random) -> bytes:
+        sent, received = rng.randint(0, 50000), rng.randint(0, 50000)
+        return json.dumps({
+            "mac": mac,
+            "rssi": rng.randint(-90, -30),
+            "latency_ms": round(rng.uniform(2, 250), 1),
+            "data_sent": sent,
+            "data_received": received,
+            "data_total": sent + received,
+            # The backend stores this as metric_timestamp; lag is measured from it
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        }).encode()
+
+    def _run(self, client, macs: list, seed: int):
+        from services.mqtt_client import TELEMETRY_TOPIC, REGISTRATION_TOPIC
+
+        rng = random.Random(seed)
+        now = time.monotonic()
+        # (due, kind, mac); start times are jittered so nodes don't publish in lockstep
+        schedule = [(now + rng.uniform(0, self.args.heartbeat_interval), "registration", m) for m in macs]
+        schedule += [(now + rng.uniform(0, self.args.telemetry_interval), "telemetry", m) for m in macs]
+        heapq.heapify(schedule)
+
+        while schedule and not self._stop.is_set():
+            due, kind, mac = heapq.heappop(schedule)
+            delay = due - time.monotonic()
+            if delay > 0 and self._stop.wait(delay):
+                break
+            if kind == "telemetry":
+                info = client.publish(TELEMETRY_TOPIC, self._payload(mac, rng), qos=self.args.qos)
+                interval = self.args.telemetry_interval
+            else:
+                info = client.publish(REGISTRATION_TOPIC, json.dumps({"mac": mac, "active": True}), qos=1)
+                interval = self.args.heartbeat_interval
+            self.stats[f"{kind}_published" if info.rc == 0 else f"{kind}_publish_failed"] += 1
+            heapq.heappush(schedule, (due + interval, kind, mac))
+
+    def start(self):
+        for i, (client, macs) in enumerate(self.clients):
+            thread = threading.Thread(target=self._run, args=(client, macs, i), name=f"loadsim-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(5)
+        for client, _ in self.clients:
+            client.loop_stop()
+            client.disconnect()
+
+
+# ======== HTTP DRIVER =========
+
+async def drive_http(base_url: str, args, deadline: float, macs: list) -> dict:
+    import httpx
+
+    timings = defaultdict(list)
+    statuses = defaultdict(Counter)
+    rng = random.Random(3)
+
+    async def call(name: str, send):
+        started = time.perf_counter()
+        try:
+            response = await send()
+            statuses[name][response.status_code] += 1
+        except httpx.HTTPError as e:
+            statuses[name][type(e).__name__] += 1
+        timings[name].append(time.perf_counter() - started)
+
+    async def worker(client: httpx.AsyncClient, name: str, rate: float, send_factory):
+        if rate <= 0:
+            return
+        while time.monotonic() < deadline:
+            await call(name, send_factory(client))
+            # Poisson arrivals at `rate` per second for this worker
+            await asyncio.sleep(rng.expovariate(rate))
+
+    login = {"username": args.admin_user, "password": args.admin_password}
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as client:
+        # /send-command is admin-only
+        response = await client.post("/api/login", data=login)
+        response.raise_for_status()
+        admin = {"Authorization": f"Bearer {response.json()['access_token']}"}
+        workers = []
+        for _ in range(args.http_concurrency):
+            workers += [
+                worker(client, "POST /login", args.login_rps / args.http_concurrency,
+                       lambda c: lambda: c.post("/login", data=login, follow_redirects=False)),
+                worker(client, "GET /dashboard", args.dashboard_rps / args.http_concurrency,
+                       lambda c: lambda: c.get("/dashboard", params={"role": "admin", "window": args.dashboard_window})),
+                worker(client, "POST /send-command", args.command_rps / args.http_concurrency,
+                       lambda c: lambda: c.post("/send-command", json={"cmd": "ping", "target": rng.choice(macs)}, headers=admin)),
+            ]
+        await asyncio.gather(*workers)
+
+    return {name: {**percentiles(values), "status": dict(statuses[name])} for name, values in timings.items()}
+
+
+# ======== MAIN =========
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broker", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    parser.add_argument("--nodes", type=int, default=1000)
+    parser.add_argument("--connections", type=int, default=10, help="MQTT connections shared by the virtual nodes")
+    parser.add_argument("--telemetry-interval", type=float, default=5.0, help="seconds between readings per node")
+    parser.add_argument("--heartbeat-interval", type=float, default=30.0, help="seconds between heartbeats per node")
+    parser.add_argument("--qos", type=int, default=0, choices=[0, 1])
+    parser.add_argument("--duration", type=float, default=60.0)
+    parser.add_argument("--drain", type=float, default=10.0, help="seconds to wait for in-flight rows after publishing stops")
+    parser.add_argument("--http-port", type=int, default=8765)
+    parser.add_argument("--http-concurrency", type=int, default=4)
+    parser.add_argument("--login-rps", type=float, default=2.0)
+    parser.add_argument("--dashboard-rps", type=float, default=5.0)
+    parser.add_argument("--dashboard-window", type=int, default=15)
+    parser.add_argument("--command-rps", type=float, default=5.0)
+    parser.add_argument("--db-latency", type=float, default=0.0, help="seconds added to every fake DAO request")
+    parser.add_argument("--spool", action="store_true", help="ingest through the SQLite spool like production")
+    parser.add_argument("--admin-user", default="loadadmin")
+    parser.add_argument("--admin-password", default="loadtest-123")
+    parser.add_argument("--json", metavar="PATH", help="also write the report as JSON")
+    args = parser.parse_args(argv)
+
+    configure_env(args)
+    # Heartbeats and telemetry must stay under the per-MAC limits
+    os.environ.setdefault("MQTT_RATE_PER_SEC", str(max(2.0, 4 / min(args.telemetry_interval, args.heartbeat_interval))))
+
+    from benchmarks.fakes import FakeStore, install_fake_supabase, install_fake_db, on_insert
+
+    store = FakeStore()
+    macs = [node["mac_address"] for node in store.seed_nodes(args.nodes)]
+    install_fake_supabase(store)
+    install_fake_db(store, latency=args.db_latency)
+
+    import uvicorn
+    from hash import hashed
+    from services import mqtt_client
+    from services.rate_limit import limiter_stats
+    import main as backend
+
+    store.seed_user(args.admin_user, hashed.hash(args.admin_password), role="admin")
+
+    lags = []
+    lag_lock = threading.Lock()
+
+    def record_lag(rows: list):
+        now = datetime.now(timezone.utc)
+        with lag_lock:
+            for row in rows:
+                try:
+                    lags.append((now - datetime.fromisoformat(row["metric_timestamp"])).total_seconds())
+                except (KeyError, TypeError, ValueError):
+                    pass
+    on_insert(store, "performance_metrics", record_lag)
+
+    # The app's lifespan starts the listener and, on exit, drains it
+    server = uvicorn.Server(uvicorn.Config(backend.app, host="127.0.0.1", port=args.http_port, log_level="warning"))
+    server_thread = threading.Thread(target=server.run, name="uvicorn", daemon=True)
+    server_thread.start()
+    while not server.started:
+        if not server_thread.is_alive():
+            print("Backend failed to start (is the broker running?)")
+            return 1
+        time.sleep(0.05)
+
+    fleet = NodeFleet(macs, args)
+    print(f"Simulating {args.nodes} nodes over {args.connections} connections for {args.duration:.0f}s "
+          f"(~{args.nodes / args.telemetry_interval:,.0f} readings/s)")
+    started = time.monotonic()
+    fleet.start()
+    http_report = asyncio.run(drive_http(f"http://127.0.0.1:{args.http_port}", args, started + args.duration, macs))
+    fleet.stop()
+
+    # Let queued readings reach the store before counting drops
+    time.sleep(args.drain)
+    server.should_exit = True
+    # Shutdown drains the ingest queue, rollups and spool
+    server_thread.join(60)
+
+    published = fleet.stats["telemetry_published"]
+    stored = len(store.table("performance_metrics"))
+    report = {
+        "nodes": args.nodes,
+        "connections": args.connections,
+        "duration_s": round(time.monotonic() - started, 1),
+        "telemetry": {
+            "published": published,
+            "publish_failed": fleet.stats["telemetry_publish_failed"],
+            "stored": stored,
+            "lost": max(published - stored, 0),
+            "stored_per_s": round(stored / args.duration, 1),
+        },
+        "ingest_lag": percentiles(lags),
+        "ingest_pipeline": dict(mqtt_client.ingest_pipeline.stats),
+        "mqtt_rejects": dict(mqtt_client.reject_counts),
+        "rate_limits": limiter_stats(),
+        "http": http_report,
+    }
+
+    print(json.dumps(report, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,238 @@
+"""Offline microbenchmarks for the backend's hot paths.
+
+    python -m benchmarks.run                          # run everything
+    python -m benchmarks.run --only oauth,mqtt        # selected suites
+    python -m benchmarks.run --save benchmarks/baseline.json
+    python -m benchmarks.run --compare benchmarks/baseline.json --threshold 0.15
+
+Supabase is replaced by benchmarks.fakes and no broker is needed: MQTT
+callbacks are fed synthetic messages directly. --compare exits with 1 when
+any benchmark regressed past the threshold.
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timezone
+
+# Modules read these at import time; a benchmark run never talks to real services
+os.environ.setdefault("SUPABASE_URL", "http://fake-supabase.local")
+os.environ.setdefault("SUPABASE_KEY", "fake-key")
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+os.environ.setdefault("MQTT_BROKER", "localhost")
+os.environ.setdefault("MQTT_PORT", "1883")
+os.environ.setdefault("INGEST_USE_SPOOL", "false")
+
+from benchmarks.fakes import FakeStore, install_fake_supabase, install_fake_db
+from benchmarks.harness import measure, print_table, save_baseline, compare
+
+NODES = 1000
+store = FakeStore()
+store.seed_nodes(NODES)
+install_fake_supabase(store)
+install_fake_db(store)
+
+from starlette.requests import Request
+
+from hash import hashed
+from schemas.metrics_schema import Metrics
+from services import oauth
+from services import mqtt_client
+from services.input_validation import validate_username, validate_password, validate_login_input
+from services.ingest import MetricsIngestPipeline
+from services.mac_cache import mac_resolver
+from services.pages import page_cache, templates
+from services.rate_limit import mqtt_limiter
+
+MACS = [node["mac_address"] for node in store.table("node")]
+
+
+class FakeMessage:
+    """What paho hands to on_message"""
+
+    def __init__(self, topic: str, payload: bytes):
+        self.topic = topic
+        self.payload = payload
+
+
+def telemetry_payload(mac: str, rng: random.Random) -> bytes:
+    return json.dumps({
+        "mac": mac,
+        "rssi": rng.randint(-90, -30),
+        "latency_ms": round(rng.uniform(2, 250), 1),
+        "data_sent": rng.randint(0, 50000),
+        "data_received": rng.randint(0, 50000),
+        "data_total": rng.randint(0, 100000),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+    }).encode()
+
+
+def cycle(items: list):
+    """Zero-argument callable returning the next item, round robin"""
+    state = {"i": -1}
+
+    def next_item():
+        state["i"] = (state["i"] + 1) % len(items)
+        return items[state["i"]]
+    return next_item
+
+
+# ======== BENCHMARKS =========
+
+def bench_mqtt(iterations: int) -> list:
+    rng = random.Random(1)
+    mac_resolver.warm()
+    # Synthetic traffic is well within any sane per-node budget; don't let the
+    # limiter turn the benchmark into a drop-path measurement
+    mqtt_limiter.rate = mqtt_limiter.burst = float("inf")
+    # Unbounded queue, emptied as we go, so submit() never hits backpressure
+    mqtt_client.ingest_pipeline._queue = queue.Queue()
+
+    telemetry = cycle([FakeMessage(mqtt_client.TELEMETRY_TOPIC, telemetry_payload(m, rng)) for m in MACS])
+    registration = cycle([
+        FakeMessage(mqtt_client.REGISTRATION_TOPIC, json.dumps({"mac": m, "active": True}).encode()) for m in MACS
+    ])
+    # Steady state: every node already announced, so no cache-sync publishes
+    mqtt_client.mqtt_mac_cache.update({node["mac_address"]: node["node_id"] for node in store.table("node")})
+    malformed = cycle([FakeMessage(mqtt_client.TELEMETRY_TOPIC, b'{"mac": "24:6F:28:00:00:01", "rssi": "strong"}')])
+
+    def on_message(next_msg):
+        def call():
+            mqtt_client.on_message(mqtt_client.get_client(), None, next_msg())
+            if mqtt_client.ingest_pipeline.depth() > 100000:
+                mqtt_client.ingest_pipeline._queue = queue.Queue()
+        return call
+
+    results = [
+        measure("mqtt.on_message telemetry", on_message(telemetry), iterations, warmup=NODES),
+        measure("mqtt.on_message registration", on_message(registration), iterations, warmup=NODES),
+        measure("mqtt.on_message malformed", on_message(malformed), iterations, warmup=100),
+    ]
+    mqtt_client.ingest_pipeline._queue = queue.Queue()
+
+    # Writer side: resolve + build rows + rollups/live views for one full batch
+    pipeline = MetricsIngestPipeline(client=install_fake_supabase(store))
+    batch = [
+        {**Metrics.model_validate_json(telemetry_payload(m, rng)).to_row(), "mac": m, "received_at": time.time()}
+        for m in rng.choices(MACS, k=pipeline.batch_size)
+    ]
+    flush = measure(f"ingest.flush batch={len(batch)}", lambda: pipeline._flush(batch), max(iterations // 200, 20), warmup=2)
+    flush["rows_per_sec"] = round(flush["ops_per_sec"] * len(batch), 1)
+    results.append(flush)
+    return results
+
+
+def bench_hash(iterations: int) -> list:
+    # bcrypt is deliberately slow; a handful of calls is plenty
+    n = max(iterations // 2000, 5)
+    stored = hashed.hash("correct-horse-1")
+    return [
+        measure("hashed.hash", lambda: hashed.hash("correct-horse-1"), n, alloc_iterations=2),
+        measure("hashed.verify", lambda: hashed.verify("correct-horse-1", stored), n, alloc_iterations=2),
+        measure("hashed.verify_async", lambda: hashed.verify_async("correct-horse-1", stored), n, alloc_iterations=2),
+    ]
+
+
+def bench_oauth(iterations: int) -> list:
+    claims = {"sub": "admin", "role": "admin", "user_id": 1, "node_id": 7}
+    token = oauth.create_access_token(claims)
+    fresh = [oauth.create_access_token({**claims, "user_id": i}) for i in range(2000)]
+    next_fresh = cycle(fresh)
+
+    def verify_uncached():
+        oauth._token_cache.clear()
+        return oauth.verify_token(next_fresh())
+
+    return [
+        measure("oauth.create_access_token", lambda: oauth.create_access_token(claims), iterations, warmup=100),
+        measure("oauth.verify_token cached", lambda: oauth.verify_token(token), iterations, warmup=100),
+        measure("oauth.verify_token uncached", verify_uncached, iterations, warmup=100),
+    ]
+
+
+def bench_validation(iterations: int) -> list:
+    usernames = cycle(["alice", "bob_the_builder", "x", "bad name!", "node-admin-42"])
+    passwords = cycle(["passw0rd1", "short", "allletters", "Sup3rSecretPassword"])
+    return [
+        measure("validate_username", lambda: validate_username(usernames()), iterations, warmup=100),
+        measure("validate_password", lambda: validate_password(passwords()), iterations, warmup=100),
+        measure("validate_login_input", lambda: validate_login_input(usernames(), passwords()), iterations, warmup=100),
+    ]
+
+
+def bench_templates(iterations: int) -> list:
+    request = Request({"type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b""})
+    rng = random.Random(2)
+    metrics = [{
+        "node_id": i, "samples": 60, "last_seen": datetime.now(timezone.utc).isoformat(),
+        "signal_strength": rng.randint(-90, -30), "latency": rng.uniform(2, 250), "data_usage": rng.randint(0, 10**6),
+        "latency_avg": 40.5, "latency_p95": 120.0, "signal_avg": -60.2, "signal_p95": -41.0,
+    } for i in range(1, 51)]
+    rows = [{**m, "metric_timestamp": m["last_seen"]} for m in metrics]
+    dashboard = {
+        "request": request, "metrics": metrics, "rows": rows, "next_cursor": rows[-1]["metric_timestamp"],
+        "window": 15, "node_id": None, "alerts": [{"node_id": 3, "message": "offline"}], "usage": {}, "role": "admin",
+    }
+
+    login = templates.get_template("login.html")
+    admin = templates.get_template("admin_dashboard.html")
+    n = max(iterations // 10, 100)
+    return [
+        measure("render login.html", lambda: login.render({"request": request, "error": "Invalid username or password"}), n, warmup=10),
+        measure("render admin_dashboard.html x50", lambda: admin.render(dashboard), n, warmup=10),
+        measure("page_cache login.html", lambda: page_cache.render("login.html", error="Invalid username or password"), iterations, warmup=10),
+    ]
+
+
+SUITES = {
+    "mqtt": bench_mqtt,
+    "hash": bench_hash,
+    "oauth": bench_oauth,
+    "validation": bench_validation,
+    "templates": bench_templates,
+}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000, help="timed calls for the fast benchmarks")
+    parser.add_argument("--only", help=f"comma-separated suites: {', '.join(SUITES)}")
+    parser.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare against a saved baseline")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed regression, 0.15 = 15%%")
+    args = parser.parse_args(argv)
+
+    selected = args.only.split(",") if args.only else list(SUITES)
+    unknown = set(selected) - set(SUITES)
+    if unknown:
+        parser.error(f"unknown suite(s): {', '.join(sorted(unknown))}")
+
+    results = []
+    for suite in selected:
+        results.extend(SUITES[suite](args.iterations))
+
+    print_table(results)
+
+    if args.save:
+        save_baseline(args.save, results, {
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "iterations": args.iterations,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        })
+        print(f"\nBaseline saved to {args.save}")
+
+    if args.compare:
+        regressions = compare(args.compare, results, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} benchmark(s) regressed more than {args.threshold:.0%}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
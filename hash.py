@@ -1,12 +1,68 @@
 from passlib.context import CryptContext
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import threading
+import time
+
+from services.instrumentation import hash_seconds
 
 pass_cxt = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", min(4, os.cpu_count() or 1)))
+# Calls allowed to wait for a worker before new ones are turned away
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", 64))
+
+_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_lock = threading.Lock()
+hash_stats = {"pending": 0, "max_pending_seen": 0, "completed": 0, "rejected": 0}
+
+
+class HashPoolBusy(Exception):
+    """Raised when too many hash/verify calls are already queued"""
+
+
+def _timed(op: str, fn, *args):
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        hash_seconds.observe(time.perf_counter() - started, op=op)
+
+
+async def _run_in_pool(op: str, fn, *args):
+    with _lock:
+        if hash_stats["pending"] >= HASH_MAX_PENDING:
+            hash_stats["rejected"] += 1
+            raise HashPoolBusy("Password hashing queue is full")
+        hash_stats["pending"] += 1
+        hash_stats["max_pending_seen"] = max(hash_stats["max_pending_seen"], hash_stats["pending"])
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, _timed, op, fn, *args)
+    finally:
+        with _lock:
+            hash_stats["pending"] -= 1
+            hash_stats["completed"] += 1
+
+
 class hashed:
     @staticmethod
     def hash(password: str) -> str:
-        return pass_cxt.hash(password)
+        return _timed("hash", pass_cxt.hash, password)
 
     @staticmethod
     def verify(plain_password: str, hash_password: str) -> bool:
-        return pass_cxt.verify(plain_password, hash_password)
+        return _timed("verify", pass_cxt.verify, plain_password, hash_password)
+
+    @staticmethod
+    async def hash_async(password: str) -> str:
+        return await _run_in_pool("hash", pass_cxt.hash, password)
+
+    @staticmethod
+    async def verify_async(plain_password: str, hash_password: str) -> bool:
+        return await _run_in_pool("verify", pass_cxt.verify, plain_password, hash_password)
+
+    @staticmethod
+    def queue_depth() -> int:
+        return hash_stats["pending"]
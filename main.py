@@ -1,14 +1,36 @@
-from fastapi import FastAPI, Depends
-from routes import auth, dashboard, register
+from dotenv import load_dotenv
 
-app = FastAPI()
+# Before any module reads its settings from the environment
+load_dotenv()
 
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends
+from routes import auth, dashboard, register, commands, messages, metrics, internal
+from services.container import ServiceContainer
+from services.instrumentation import timing_middleware
+from services.static_assets import static_assets
 
-app.include_router(auth.router)
-app.include_router(dashboard.router)
-app.include_router(register.router)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    services = ServiceContainer()
+    app.state.services = services
+    await services.start()
+    try:
+        yield
+    finally:
+        await services.stop()
 
 
+app = FastAPI(lifespan=lifespan)
+app.middleware("http")(timing_middleware)
 
 
+app.include_router(auth.router)
+app.include_router(dashboard.router)
+app.include_router(register.router)
+app.include_router(commands.router)
+app.include_router(messages.router)
+app.include_router(metrics.router)
+app.include_router(internal.router)
+app.mount("/static", static_assets, name="static")
@@ -1,9 +1,8 @@
 from fastapi import APIRouter, Request, Form, HTTPException, status, Depends
-from fastapi.templating import Jinja2Templates
 from fastapi.security import HTTPBearer
-from services.supabase_client import supabase
 from hash import hashed
 from services import oauth
+from services.pages import page_cache, templates as template
 import logging
 from typing import Optional, Dict, Any
 from datetime import datetime, timedelta
@@ -11,7 +10,6 @@ import re
 from services.input_validation import validate_password, validate_username, get_available_node,authenticate_user,validate_login_input,create_secure_cookie_response, create_user_token,check_username_exists 
 from fastapi.responses import RedirectResponse
 router = APIRouter()
-template = Jinja2Templates(directory='templates')
 logger = logging.getLogger(__name__)
 security = HTTPBearer(auto_error=False)
 
@@ -32,15 +30,8 @@ ROLE_REDIRECTS = {
 
 @router.get("/login")
 async def login_page(request: Request, success: Optional[str] = None, error: Optional[str] = None):
-    """Display the login form"""
-    context = {"request": request}
-    
-    if success:
-        context["success"] = success
-    if error:
-        context["error"] = error
-        
-    return template.TemplateResponse("login.html", context)
+    """Display the login form; renders are cached per error/success message"""
+    return page_cache.response(request, "login.html", error=error, success=success)
 
 @router.post("/login", tags=['auth'], response_model=None)
 async def login_form(
@@ -154,7 +145,7 @@ async def api_login(
         return {
             "access_token": token,
             "token_type": "bearer",
-            "expires_in": TOKEN_EXPIRE_HOURS * 3600,
+            "expires_in": oauth.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
             "user": {
                 "username": user["username"],
                 "role": user["role"],
@@ -175,61 +166,23 @@ async def api_login(
 # ========== UTILITY ROUTES ==========
 
 @router.get("/api/auth/verify", tags=['auth'])
-async def verify_token(request: Request):
+async def verify_token(user: Dict[str, Any] = Depends(oauth.get_current_user)):
     """Verify if current token is valid"""
-    try:
-        # Get token from cookie
-        token = request.cookies.get("access_token")
-        
-        if not token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="No authentication token found"
-            )
-        
-        # Verify token (implement this in your sva module)
-        # user_data = sva.verify_access_token(token)
-        
-        return {
-            "valid": True,
-            "message": "Token is valid"
-            # "user": user_data  # Include user data if needed
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Token verification error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Invalid or expired token"
-        )
+    return {
+        "valid": True,
+        "message": "Token is valid",
+        "expires_at": user.get("exp")
+    }
 
 @router.get("/api/auth/me", tags=['auth'])
-async def get_current_user(request: Request):
+async def get_current_user(user: Dict[str, Any] = Depends(oauth.get_current_user)):
     """Get current authenticated user information"""
-    try:
-        token = request.cookies.get("access_token")
-        
-        if not token:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Not authenticated"
-            )
-        
-        # Decode token and get user info
-        # user_data = sva.verify_access_token(token)
-        
-        return {
-            # "user": user_data,
-            "authenticated": True
-        }
-        
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Get current user error: {str(e)}")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Authentication verification failed"
-        )
+    return {
+        "user": {
+            "username": user.get("sub"),
+            "role": user.get("role"),
+            "user_id": user.get("user_id"),
+            "node_id": user.get("node_id")
+        },
+        "authenticated": True
+    }
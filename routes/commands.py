@@ -1,14 +1,36 @@
-from fastapi import APIRouter, Request
-from schemas.mqtt_schema import Command
-from services.mqtt__publisher import publish_command
+import asyncio
+from fastapi import APIRouter, Request, HTTPException, status, Depends
+from typing import Dict, Any
+from schemas.mqtt_schema import Command, BatchCommand
+from services import oauth
+from services.mqtt__publisher import command_publisher
 
 router = APIRouter()
 
 
 @router.post("/send-command", tags=["mqtt"])
-async def send_command(command: Command):
+async def send_command(command: Command, user: Dict[str, Any] = Depends(oauth.require_role("admin"))):
     """
     Send a command from backend to ESP nodes via /mesh/commands topic
     """
-    publish_command(command.dict())
+    try:
+        await command_publisher.publish_async(command.dict())
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Broker did not acknowledge the command")
+    except (ConnectionError, BufferError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     return {"message": "Command sent successfully"}
+
+
+@router.post("/send-command/batch", tags=["mqtt"])
+async def send_batch_command(command: BatchCommand, user: Dict[str, Any] = Depends(oauth.require_role("admin"))):
+    """
+    Fan one command out to many ESP nodes over the shared publisher connection
+    """
+    failed = await command_publisher.publish_many(command.cmd, command.targets)
+    failed = {target: error for target, error in failed.items() if error}
+    return {
+        "message": "Command sent successfully" if not failed else "Command partially sent",
+        "sent": len(command.targets) - len(failed),
+        "failed": failed
+    }
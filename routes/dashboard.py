@@ -1,27 +1,49 @@
 from fastapi import APIRouter, Request, Depends, Query, HTTPException
-from fastapi.templating import Jinja2Templates
-from services.supabase_client import supabase
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+import json
+from services.db import db, eq
+from services.metrics_queries import window_bounds, fetch_metrics_page, node_rollups, recent_alerts
+from services.timeseries import timeseries_store
+from services.live_feed import live_feed, LIVE_MIN_INTERVAL
+from services.pages import templates
+
+# Comment line sent when no data flowed, keeps proxies from closing idle streams
+SSE_KEEPALIVE_SECONDS = 15
 
 router = APIRouter()
-templates = Jinja2Templates(directory="template")
 
 @router.get("/dashboard",  response_model=None)
-async def show_dashboard(request: Request, role: str = Query("admin"), user_id: int = Query(None)):
+async def show_dashboard(
+    request: Request,
+    role: str = Query("admin"),
+    user_id: int = Query(None),
+    window: int = Query(15, ge=1, description="Window in minutes"),
+    before: Optional[str] = Query(None, description="Cursor from the previous page"),
+    node_id: Optional[int] = Query(None)
+):
 
-    # 1. Admin: Get all metrics
+    # 1. Admin: per-node rollups over the window plus one page of raw rows
     if role == "admin":
-        perf_data = supabase.table("performance_metrics").select("*").execute()
-        log_data = supabase.table("network_logs").select("*").execute()
+        start, end = window_bounds(window)
+        try:
+            rows, next_cursor = await fetch_metrics_page(start, end, before=before, node_id=node_id)
+        except (ValueError, TypeError):
+            raise HTTPException(status_code=400, detail="Invalid page cursor")
+
+        metrics = await node_rollups(start, end)
+        alerts = await recent_alerts(start, end)
 
-        if not perf_data.data:
+        if not metrics and not rows:
             raise HTTPException(status_code=404, detail="No performance data found")
-        
-        metrics = perf_data.data
-        alerts = [{"node_id": log["node_id"], "message": log["event_type"]} for log in log_data.data]
 
-        return templates.TemplateResponse("dashboard.html", {
+        return templates.TemplateResponse("admin_dashboard.html", {
             "request": request,
             "metrics": metrics,
+            "rows": rows,
+            "next_cursor": next_cursor,
+            "window": window,
+            "node_id": node_id,
             "alerts": alerts,
             "usage": {},  # admin doesn't need personal usage
             "role": role
@@ -32,24 +54,28 @@ async def show_dashboard(request: Request, role: str = Query("admin"), user_id:
         if not user_id:
             raise HTTPException(status_code=400, detail="User ID required for user view")
 
-        user_data = supabase.table("user_accounts").select("node_id").eq("user_id", user_id).execute()
+        user_data = await db.select("user_accounts", "node_id", {"user_id": eq(user_id)}, limit=1)
 
-        if not user_data.data:
+        if not user_data:
             raise HTTPException(status_code=404, detail="User not found")
         
-        node_id = user_data.data[0]["node_id"]
+        node_id = user_data[0]["node_id"]
 
-        perf = supabase.table("performance_metrics").select("*").eq("node_id", node_id).limit(1).execute()
+        perf = await db.select(
+            "performance_metrics", "data_usage,latency,signal_strength", {"node_id": eq(node_id)},
+            order="metric_timestamp.desc", limit=1
+        )
 
-        if not perf.data:
+        if not perf:
             raise HTTPException(status_code=404, detail="No metrics for your node")
 
         usage = {
-            "data_usage": perf.data[0]["data_usage"],
-            "latency": perf.data[0]["latency"]
+            "data_usage": perf[0]["data_usage"],
+            "latency": perf[0]["latency"],
+            "signal_strength": perf[0]["signal_strength"]
         }
 
-        return templates.TemplateResponse("dashboard.html", {
+        return templates.TemplateResponse("admin_dashboard.html", {
             "request": request,
             "metrics": [],  # not needed for user
             "alerts": [],
@@ -59,3 +85,44 @@ async def show_dashboard(request: Request, role: str = Query("admin"), user_id:
 
     else:
         raise HTTPException(status_code=400, detail="Invalid role provided")
+
+
+@router.get("/api/dashboard/live", tags=["dashboard"])
+async def live_metrics(seconds: int = Query(300, ge=1), node_id: Optional[int] = Query(None)):
+    """Recent per-node aggregates served from the in-memory store (no DB reads)"""
+    node_ids = [node_id] if node_id is not None else timeseries_store.nodes()
+    nodes = [agg for agg in (timeseries_store.aggregate(n, seconds) for n in node_ids) if agg]
+    return {
+        "window_seconds": min(seconds, timeseries_store.window_seconds),
+        "nodes": nodes
+    }
+
+
+@router.get("/api/dashboard/stream", tags=["dashboard"])
+async def stream_metrics(
+    request: Request,
+    node_id: Optional[List[int]] = Query(None),
+    interval: float = Query(LIVE_MIN_INTERVAL, ge=LIVE_MIN_INTERVAL, description="Minimum seconds between pushes")
+):
+    """Server-Sent Events feed of live telemetry, optionally filtered by node_id"""
+    sub = live_feed.subscribe(node_id, interval)
+    if sub is None:
+        raise HTTPException(status_code=503, detail="Too many live dashboard connections")
+
+    async def event_stream():
+        try:
+            while not sub.closed:
+                if await request.is_disconnected():
+                    break
+                batch = await sub.next_batch(SSE_KEEPALIVE_SECONDS)
+                if batch:
+                    yield f"data: {json.dumps(batch, default=str)}\n\n"
+                elif not sub.closed:
+                    yield ": keepalive\n\n"
+        finally:
+            live_feed.unsubscribe(sub)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
@@ -0,0 +1,22 @@
+from fastapi import APIRouter, Header, HTTPException, status
+from fastapi.responses import PlainTextResponse
+from typing import Optional
+import secrets
+import os
+
+from services.instrumentation import registry
+
+router = APIRouter()
+
+# Scrapers send "Authorization: Bearer <token>"; unset leaves the endpoint open
+# for deployments that only expose it on a private network
+INTERNAL_METRICS_TOKEN = os.getenv("INTERNAL_METRICS_TOKEN")
+
+
+@router.get("/internal/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def internal_metrics(authorization: Optional[str] = Header(None)):
+    if INTERNAL_METRICS_TOKEN:
+        scheme, _, token = (authorization or "").partition(" ")
+        if scheme.lower() != "bearer" or not secrets.compare_digest(token, INTERNAL_METRICS_TOKEN):
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid metrics token")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,20 +1,18 @@
-from fastapi import Request, APIRouter, Depends, HTTPException, status
+from fastapi import Request, APIRouter, Depends, HTTPException, status, Query
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from typing import Optional
 from schemas.esp_mesh import Meshmessage
+from services.message_store import message_store
+from services.rate_limit import enforce, messages_node_limiter, messages_credential_limiter
 import secrets
 import os
-from dotenv import load_dotenv
 router = APIRouter()
 security = HTTPBasic()
 
-
-load_dotenv()
-
 VALID_USERNAME = os.getenv("BACKEND_UNAME")
 VALID_PASSWORD = os.getenv("BACKEND_PASSWORD")
 
-messages = []
-
 # Authentication function
 def authenticate_device(credentials: HTTPBasicCredentials = Depends(security)):
     correct_username = secrets.compare_digest(credentials.username, VALID_USERNAME)
@@ -25,13 +23,27 @@ def authenticate_device(credentials: HTTPBasicCredentials = Depends(security)):
             detail="Invalid authentication credentials",
             headers={"WWW-Authenticate": "Basic"},
         )
+    return credentials.username
 
 @router.post("/api/messages")
-async def receive_messages(msg: Meshmessage, _: str = Depends(authenticate_device)):
-    messages.append(msg)
-    print(f"Received from {msg.node_id}: {msg.message}")
-    return {"message": "Message received successfully"}
+async def receive_messages(msg: Meshmessage, device: str = Depends(authenticate_device)):
+    # Checked before the message touches the store
+    await enforce(messages_credential_limiter, device)
+    await enforce(messages_node_limiter, msg.node_id)
+    message_id = await run_in_threadpool(message_store.add, msg.node_id, msg.message)
+    return {"message": "Message received successfully", "id": message_id}
 
 @router.get("/api/messages")
-async def get_messages(_: str = Depends(authenticate_device)):
-    return messages
+async def get_messages(
+    since_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    node_id: Optional[int] = Query(None),
+    device: str = Depends(authenticate_device)
+):
+    """Page through stored messages; pass next_since_id back to continue"""
+    await enforce(messages_credential_limiter, device)
+    rows = await run_in_threadpool(message_store.list, since_id, limit, node_id)
+    return {
+        "messages": rows,
+        "next_since_id": rows[-1]["id"] if rows else since_id
+    }
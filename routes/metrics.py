@@ -1,25 +1,129 @@
-from fastapi import status, APIRouter, HTTPException, FastAPI
+from fastapi import status, APIRouter, HTTPException, FastAPI, Request, Depends
+from fastapi.exceptions import RequestValidationError
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Optional
 from schemas.metrics_schema import Metrics
-from services.supabase_client import supabase
-from services.mqtt_client import mqtt_mac_cache
+from services.db import db, DatabaseError
+from services.mac_cache import mac_resolver
+from services.spool import IDEMPOTENCY_KEY
+from services.rollups import rollup_aggregator
+import time
+from services.rate_limit import enforce, metrics_limiter
+from routes.messages import authenticate_device
 
 router = APIRouter()
 
-router.post('/metrics', status_code=status.HTTP_200_OK)
-async def receive_metrics(metrics: Metrics):
-    result = supabase.table('node').eq('mac_address', metrics.mac_address).single().execute()
+# Readings accepted per bulk request
+METRICS_BULK_MAX = 5000
+metrics_list = TypeAdapter(List[Metrics])
 
-    if not result.data:
+def database_unavailable(e: DatabaseError) -> HTTPException:
+    """409 for constraint conflicts (e.g. a node deleted meanwhile), 503 otherwise"""
+    if e.status_code == status.HTTP_409_CONFLICT:
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail='Reading conflicts with stored data')
+    return HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail='Metrics store unavailable')
+
+async def store_rows(rows: list):
+    # A retried reading is ignored, not a unique-index 409; one duplicate
+    # must not reject a whole batch either
+    try:
+        # With ignore-duplicates only newly inserted rows come back
+        inserted = await db.insert(
+            'performance_metrics', rows, on_conflict=IDEMPOTENCY_KEY, ignore_duplicates=True, returning=True
+        )
+    except DatabaseError as e:
+        raise database_unavailable(e)
+
+    # Same rollups the MQTT writer feeds, so long dashboard windows count these
+    # too; a resent reading was rolled up the first time
+    received = time.time()
+    for row in inserted:
+        rollup_aggregator.add_row(row['node_id'], row, received)
+
+@router.post('/metrics', status_code=status.HTTP_200_OK)
+async def receive_metrics(metrics: Metrics, device: str = Depends(authenticate_device)):
+    await enforce(metrics_limiter, metrics.mac_address)
+    try:
+        node_id = await mac_resolver.resolve_async(metrics.mac_address)
+    except DatabaseError as e:
+        raise database_unavailable(e)
+
+    if node_id is None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail='Device not available')
-    
-
-    node_id = result.data[0]['node_id']
-
-    supabase.table('performance_metrics').insert({
-        'node_id' : node_id,
-        'signal_strength' : metrics.signal_strength,
-        'latency' :  metrics.latency,
-        'data_usage': metrics.data_usage
-    }).execute()
-    
-    return {'message': 'Sucessful'}
\ No newline at end of file
+
+    await store_rows([{**metrics.to_row(), 'node_id': node_id}])
+
+    return {'message': 'Sucessful'}
+
+def too_many_readings() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f'At most {METRICS_BULK_MAX} readings per request'
+    )
+
+def invalid_body(e: ValidationError, line: Optional[int] = None) -> RequestValidationError:
+    # RequestValidationError's handler makes ctx (which may hold the raw
+    # ValueError from a validator) JSON-safe
+    prefix = ('body',) if line is None else ('body', line)
+    return RequestValidationError([{**err, 'loc': prefix + tuple(err['loc'])} for err in e.errors(include_url=False)])
+
+async def read_ndjson(request: Request) -> List[Metrics]:
+    """Parse line by line as the body streams in, stopping at METRICS_BULK_MAX"""
+    readings = []
+    line_no = 0
+
+    def add(line: bytes):
+        nonlocal line_no
+        line_no += 1
+        if not line.strip():
+            return
+        if len(readings) >= METRICS_BULK_MAX:
+            raise too_many_readings()
+        try:
+            readings.append(Metrics.model_validate_json(line))
+        except ValidationError as e:
+            raise invalid_body(e, line_no)
+
+    buffer = b''
+    async for chunk in request.stream():
+        buffer += chunk
+        *lines, buffer = buffer.split(b'\n')
+        for line in lines:
+            add(line)
+    add(buffer)
+    return readings
+
+async def read_bulk_body(request: Request) -> List[Metrics]:
+    """JSON array, or one JSON reading per line for application/x-ndjson"""
+    if 'ndjson' in request.headers.get('content-type', ''):
+        return await read_ndjson(request)
+    try:
+        readings = metrics_list.validate_json(await request.body())
+    except ValidationError as e:
+        raise invalid_body(e)
+    if len(readings) > METRICS_BULK_MAX:
+        raise too_many_readings()
+    return readings
+
+@router.post('/metrics/bulk', status_code=status.HTTP_200_OK)
+async def receive_metrics_bulk(request: Request, device: str = Depends(authenticate_device)):
+    """Store many readings (e.g. a gateway's whole mesh) with one lookup and one insert"""
+    readings = await read_bulk_body(request)
+
+    # Over-limit readings are dropped per MAC; the rest of the batch is kept
+    verdicts = await metrics_limiter.allow_many_async(r.mac_address for r in readings)
+    allowed = [r for r, ok in zip(readings, verdicts) if ok]
+    limited = len(readings) - len(allowed)
+    readings = allowed
+
+    try:
+        node_ids = await mac_resolver.resolve_many_async(r.mac_address for r in readings)
+    except DatabaseError as e:
+        raise database_unavailable(e)
+
+    rows = [{**r.to_row(), 'node_id': node_ids[r.mac_address]} for r in readings if r.mac_address in node_ids]
+    if rows:
+        await store_rows(rows)
+
+    unknown = sorted({r.mac_address for r in readings if r.mac_address not in node_ids})
+    return {'message': 'Sucessful', 'stored': len(rows), 'rate_limited': limited, 'unknown_macs': unknown}
\ No newline at end of file
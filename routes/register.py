@@ -1,25 +1,43 @@
-from fastapi import APIRouter, Request, Form, Depends, HTTPException
+from fastapi import APIRouter, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
 from typing import Optional
-from sqlalchemy.orm import Session
 from starlette.status import HTTP_302_FOUND
 
-from services.database import get_sqlite_db
-from models import Users, Devices, Node
-from utils.mac_lookup import get_mac_address
-from utils.hashing import hashed
-from utils.validation import validate_username, validate_password
-from user_schema import User
+from services.db import db, DatabaseError
+from services.neighbor_table import get_mac_address
+from services.mac_cache import mac_resolver
+from services.pages import page_cache, templates as template
+from services.input_validation import validate_username, validate_password
+from hash import hashed, HashPoolBusy
 
 import logging
 
 
 logger = logging.getLogger(__name__)
-template = Jinja2Templates(directory="templates")
 
 router = APIRouter()
 
+# Creates the user account and its device in one transaction (sql/register_user_device.sql)
+REGISTER_RPC = "register_user_device"
+
+# PostgREST answers both of these with 409
+UNIQUE_VIOLATION = "23505"
+FOREIGN_KEY_VIOLATION = "23503"
+USERNAME_CONSTRAINT = "user_accounts_username_key"
+
+
+def registration_error(e: DatabaseError) -> str:
+    """User-facing message for a failed register_user_device call"""
+    if e.code == UNIQUE_VIOLATION and USERNAME_CONSTRAINT in e.detail:
+        return "Username already exists"
+    if e.code == UNIQUE_VIOLATION:
+        return "This device is already registered to an account"
+    if e.code == FOREIGN_KEY_VIOLATION:
+        return "The node for this device is no longer available"
+    logger.error(f"Failed to register user: {e}")
+    return "Registration failed. Try again later."
+
+
 #=======Web Interface=========
 @router.get("/")
 async def home_page(request: Request):
@@ -27,7 +45,8 @@ async def home_page(request: Request):
 
 @router.get("/index", response_class=HTMLResponse)
 async def show_home_page(request: Request):
-    return template.TemplateResponse("index.html", {"request": request})
+    # Pre-rendered at startup; repeat visits get a 304
+    return page_cache.response(request, "index.html")
 
 @router.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request, error: Optional[str] = None, success: Optional[str] = None):
@@ -51,8 +70,7 @@ async def register_form(
     request: Request,
     username: str = Form(...),
     password: str = Form(...),
-    confirm_password: str = Form(...),
-    db: Session = Depends(get_sqlite_db)
+    confirm_password: str = Form(...)
 ):
     client_ip = request.client.host
     mac_address = get_mac_address(client_ip)
@@ -85,19 +103,9 @@ async def register_form(
     # Clean username
     username = username.strip().lower()
 
-    # Check for existing user
-    user_exists = db.query(Users).filter_by(username=username).first()
-    if user_exists:
-        return template.TemplateResponse("register.html", {
-            "request": request,
-            "error": "Username already exists",
-            "mac_address": mac_address,
-            "node_available": True
-        })
-
-    # Assign node by MAC prefix match
-    node = db.query(Node).filter(Node.mac_address.startswith(mac_address[:8])).first()
-    if not node:
+    # Assign node by MAC prefix (OUI) match
+    node_id = await mac_resolver.match_prefix_async(mac_address)
+    if node_id is None:
         return template.TemplateResponse("register.html", {
             "request": request,
             "error": "No matching node found for this MAC address",
@@ -106,25 +114,26 @@ async def register_form(
         })
 
     try:
-        new_user = Users(username=username, password_hash=hashed.hash(password))
-        db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
-
-        new_device = Devices(user_id=new_user.user_id, node_id=node.node_id, mac_address=mac_address)
-        db.add(new_device)
-        db.commit()
+        password_hash = await hashed.hash_async(password)
+        # Username uniqueness is enforced by the constraint, not a prior lookup
+        await db.rpc(REGISTER_RPC, {
+            "p_username": username,
+            "p_password_hash": password_hash,
+            "p_node_id": node_id,
+            "p_mac_address": mac_address
+        }, name="register user")
 
         return RedirectResponse(url="/login?success=Registration successful! Please log in.", status_code=HTTP_302_FOUND)
 
-    except Exception as e:
-        logger.error(f"Failed to register user: {e}")
-        db.rollback()
-        return template.TemplateResponse("register.html", {
-            "request": request,
-            "error": "Registration failed. Try again later.",
-            "mac_address": mac_address,
-            "username": username,
-            "node_available": True
-        })
+    except HashPoolBusy:
+        error = "The server is busy. Please try again in a moment."
+    except DatabaseError as e:
+        error = registration_error(e)
 
+    return template.TemplateResponse("register.html", {
+        "request": request,
+        "error": error,
+        "mac_address": mac_address,
+        "username": username,
+        "node_available": True
+    })
@@ -1,9 +1,32 @@
-from pydantic import BaseModel
+from typing import Optional, Union
+from pydantic import BaseModel, ConfigDict, Field, AliasChoices, field_validator
 
 
 
 class Metrics(BaseModel):
-    signal_strength : float
-    latency : float
-    data_usage : float
-    mac_address:  str
\ No newline at end of file
+    """One telemetry reading, shared by the MQTT and HTTP ingest paths.
+
+    Field names are the performance_metrics columns; the aliases accept the
+    names ESP firmware publishes on /mesh/backend (rssi, latency_ms, ...).
+    """
+    model_config = ConfigDict(populate_by_name=True)
+
+    signal_strength : float = Field(validation_alias=AliasChoices('signal_strength', 'rssi'))
+    latency : float = Field(validation_alias=AliasChoices('latency', 'latency_ms'))
+    data_usage : float = Field(validation_alias=AliasChoices('data_usage', 'data_total'))
+    data_sent : Optional[float] = None
+    data_received : Optional[float] = None
+    metric_timestamp : Optional[Union[int, float, str]] = Field(None, validation_alias=AliasChoices('metric_timestamp', 'timestamp'))
+    mac_address:  str = Field(validation_alias=AliasChoices('mac_address', 'mac'))
+
+    @field_validator('mac_address')
+    @classmethod
+    def normalize_mac(cls, value: str) -> str:
+        value = value.strip().upper()
+        if not value:
+            raise ValueError('MAC address is required')
+        return value
+
+    def to_row(self) -> dict:
+        """performance_metrics columns (node_id is added once the MAC is resolved)"""
+        return self.model_dump(exclude={'mac_address'})
\ No newline at end of file
@@ -1,5 +1,51 @@
-from pydantic import BaseModel
+from typing import List, Optional, Union
+from pydantic import BaseModel, StrictInt, field_validator
 
 class Command(BaseModel):
     cmd: str
-    target: str  # Could be a node ID or MAC
\ No newline at end of file
+    target: str  # Could be a node ID or MAC
+
+class BatchCommand(BaseModel):
+    cmd: str
+    targets: List[str]  # Node IDs or MACs to fan the command out to
+
+def _normalize_mac(value: str) -> str:
+    value = value.strip().upper()
+    if not value:
+        raise ValueError("MAC address is required")
+    return value
+
+class RegistrationMessage(BaseModel):
+    """Heartbeat published by ESP nodes on nodewave/registration"""
+    mac: str
+    active: bool = False
+
+    @field_validator("mac")
+    @classmethod
+    def normalize_mac(cls, value: str) -> str:
+        return _normalize_mac(value)
+
+class CacheSyncMessage(BaseModel):
+    """MAC -> node_id mapping the leader shares on nodewave/backend/mac-cache"""
+    mac: str
+    node_id: StrictInt
+
+    @field_validator("mac")
+    @classmethod
+    def normalize_mac(cls, value: str) -> str:
+        return _normalize_mac(value)
+
+class LiveRow(BaseModel):
+    """One stored performance_metrics row, as relayed to the live views"""
+    node_id: StrictInt
+    signal_strength: Optional[float] = None
+    latency: Optional[float] = None
+    data_usage: Optional[float] = None
+    data_sent: Optional[float] = None
+    data_received: Optional[float] = None
+    metric_timestamp: Optional[Union[int, float, str]] = None
+
+class LiveRowsMessage(BaseModel):
+    """A worker's flushed batch on nodewave/backend/live-rows; received[i] is rows[i]'s receipt time"""
+    rows: List[LiveRow]
+    received: List[Optional[float]]
\ No newline at end of file
@@ -0,0 +1,96 @@
+# Process-wide clients and background workers, owned by the app lifespan
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from services.db import db
+from services.maintenance import retention_job
+from services.mqtt__publisher import command_publisher
+from services.pages import page_cache
+from services.rollups import rollup_aggregator
+from services.static_assets import static_assets
+
+logger = logging.getLogger(__name__)
+
+# Off for HTTP-only workers that shouldn't consume telemetry
+MQTT_LISTENER_ENABLED = os.getenv("MQTT_LISTENER_ENABLED", "true").lower() == "true"
+# Seconds between listener start attempts while the broker is unreachable (0 = don't retry)
+MQTT_START_RETRY = float(os.getenv("MQTT_START_RETRY", 30))
+
+
+class ServiceContainer:
+    """Starts the background services on startup and drains them on shutdown.
+
+    Clients are still created lazily (services.supabase_client.get_supabase,
+    services.mqtt_client.get_client), so importing the app connects to nothing.
+    Blocking start/stop calls run in a thread to keep the event loop free.
+    An unreachable broker doesn't stop the app from serving HTTP; the
+    listener is retried in the background instead.
+    """
+
+    def __init__(self, mqtt_listener: bool = MQTT_LISTENER_ENABLED, mqtt_retry: float = MQTT_START_RETRY):
+        self.mqtt_listener = mqtt_listener
+        self.mqtt_retry = mqtt_retry
+        self.mqtt_running = False
+        self.started = False
+        self._mqtt_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        static_assets.load()
+        page_cache.warm()
+        retention_job.start()
+        if self.mqtt_listener and not await self._start_mqtt() and self.mqtt_retry > 0:
+            self._mqtt_task = asyncio.get_running_loop().create_task(self._retry_mqtt())
+        # HTTP /metrics feeds rollups too, so they flush even without the listener
+        rollup_aggregator.start()
+        self.started = True
+
+    async def _start_mqtt(self) -> bool:
+        """Start the listener; on failure tear down whatever it had started"""
+        # Imported here so HTTP-only workers never load the listener
+        from services.mqtt_client import start_mqtt_listener, stop_mqtt_listener
+        try:
+            # Connects, warms the MAC/status caches and starts the ingest workers
+            await asyncio.to_thread(start_mqtt_listener)
+        except Exception as e:
+            logger.error(f"MQTT listener failed to start, serving HTTP without it: {e}")
+            try:
+                await asyncio.to_thread(stop_mqtt_listener)
+            except Exception as stop_error:
+                logger.warning(f"MQTT listener cleanup failed: {stop_error}")
+            # Shared with HTTP ingest, and stop_mqtt_listener stops it
+            rollup_aggregator.start()
+            return False
+        self.mqtt_running = True
+        return True
+
+    async def _retry_mqtt(self):
+        while True:
+            await asyncio.sleep(self.mqtt_retry)
+            if await self._start_mqtt():
+                logger.info("MQTT listener started after retry")
+                return
+
+    async def stop(self):
+        """Stop intake first, then flush everything still buffered"""
+        if self._mqtt_task is not None:
+            self._mqtt_task.cancel()
+            try:
+                await self._mqtt_task
+            except asyncio.CancelledError:
+                pass
+            self._mqtt_task = None
+        # Also after a cancelled retry, whose start may have finished in its thread
+        if self.mqtt_listener and self.started:
+            from services.mqtt_client import stop_mqtt_listener
+            # Drains the ingest queue, rollups, node status writes and the spool
+            await asyncio.to_thread(stop_mqtt_listener)
+            self.mqtt_running = False
+        await asyncio.to_thread(rollup_aggregator.stop)
+        # Publishes queued commands and waits for their acks before disconnecting
+        await asyncio.to_thread(command_publisher.stop)
+        await retention_job.stop()
+        await db.close()
+        self.started = False
+        logger.info("Services stopped")
@@ -0,0 +1,252 @@
+# Async data-access layer over Supabase's PostgREST API
+import logging
+import os
+import time
+from typing import Any, Iterable, Optional
+
+import httpx
+from decouple import config
+
+from services.instrumentation import db_seconds, record_error
+
+logger = logging.getLogger(__name__)
+
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", 10))
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 20))
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 500))
+
+
+class DatabaseError(Exception):
+    """`code` is the Postgres SQLSTATE (e.g. "23505") when PostgREST reports one"""
+
+    def __init__(self, message: str, status_code: Optional[int] = None, code: Optional[str] = None, detail: str = ""):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        # PostgREST's message + details, e.g. the violated constraint's name
+        self.detail = detail
+
+    @classmethod
+    def from_response(cls, name: str, response: httpx.Response) -> "DatabaseError":
+        try:
+            body = response.json()
+        except ValueError:
+            body = None
+        if not isinstance(body, dict):
+            return cls(f"{name} failed: {response.text}", response.status_code)
+        detail = " ".join(str(body[k]) for k in ("message", "details") if body.get(k))
+        return cls(f"{name} failed: {response.text}", response.status_code, body.get("code"), detail)
+
+
+# ======== FILTER HELPERS =========
+# Filters are passed as {column: "<op>.<value>"} in PostgREST syntax
+
+def eq(value: Any) -> str:
+    return f"eq.{value}"
+
+def neq(value: Any) -> str:
+    return f"neq.{value}"
+
+def gt(value: Any) -> str:
+    return f"gt.{value}"
+
+def gte(value: Any) -> str:
+    return f"gte.{value}"
+
+def lt(value: Any) -> str:
+    return f"lt.{value}"
+
+def lte(value: Any) -> str:
+    return f"lte.{value}"
+
+def in_(values: Iterable[Any]) -> str:
+    quoted = ",".join(f'"{v}"' for v in values)
+    return f"in.({quoted})"
+
+
+class QueryStats:
+    """Per-query latency counters (count, errors, total/max ms)"""
+
+    def __init__(self):
+        self._stats: dict = {}
+
+    def record(self, name: str, elapsed_ms: float, ok: bool):
+        s = self._stats.setdefault(name, {"count": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0})
+        s["count"] += 1
+        s["total_ms"] += elapsed_ms
+        s["max_ms"] = max(s["max_ms"], elapsed_ms)
+        if not ok:
+            s["errors"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            name: {**s, "avg_ms": s["total_ms"] / s["count"] if s["count"] else 0.0}
+            for name, s in self._stats.items()
+        }
+
+
+class SupabaseDAO:
+    """Async Supabase access over one shared, keep-alive httpx client.
+
+    Every call is named (defaults to "<method> <table>") so latency is
+    tracked per query in `stats`.
+    """
+
+    def __init__(
+        self,
+        url: Optional[str] = None,
+        key: Optional[str] = None,
+        timeout: float = DB_TIMEOUT,
+        max_connections: int = DB_MAX_CONNECTIONS,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self._url = url
+        self._key = key
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._transport = transport
+        self._http: Optional[httpx.AsyncClient] = None
+        self.stats = QueryStats()
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        if self._http is None:
+            url = self._url or config("SUPABASE_URL")
+            key = self._key or config("SUPABASE_KEY")
+            self._http = httpx.AsyncClient(
+                base_url=f"{url.rstrip('/')}/rest/v1",
+                headers={"apikey": key, "Authorization": f"Bearer {key}"},
+                timeout=self.timeout,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                transport=self._transport,
+            )
+        return self._http
+
+    async def close(self):
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+    async def _request(
+        self,
+        name: str,
+        method: str,
+        path: str,
+        params: Optional[dict] = None,
+        json: Any = None,
+        headers: Optional[dict] = None,
+        timeout: Optional[float] = None,
+    ) -> httpx.Response:
+        start = time.perf_counter()
+        ok = False
+        try:
+            response = await self.http.request(
+                method, path, params=params, json=json, headers=headers,
+                timeout=timeout if timeout is not None else self.timeout,
+            )
+            if response.is_error:
+                raise DatabaseError.from_response(name, response)
+            ok = True
+            return response
+        except httpx.HTTPError as e:
+            record_error("db", e)
+            raise DatabaseError(f"{name} failed: {e}") from e
+        finally:
+            elapsed = time.perf_counter() - start
+            elapsed_ms = elapsed * 1000
+            self.stats.record(name, elapsed_ms, ok)
+            db_seconds.observe(elapsed, query=name)
+            if elapsed_ms > DB_SLOW_QUERY_MS:
+                logger.warning(f"Slow query {name}: {elapsed_ms:.0f} ms")
+
+    # ======== QUERIES =========
+
+    async def select(
+        self,
+        table: str,
+        columns: str = "*",
+        filters: Optional[dict] = None,
+        order: Optional[str] = None,
+        limit: Optional[int] = None,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> list:
+        params = {"select": columns, **(filters or {})}
+        if order:
+            params["order"] = order
+        if limit is not None:
+            params["limit"] = limit
+        response = await self._request(name or f"select {table}", "GET", f"/{table}", params=params, timeout=timeout)
+        return response.json()
+
+    async def insert(
+        self,
+        table: str,
+        rows,
+        upsert: bool = False,
+        on_conflict: Optional[str] = None,
+        returning: bool = False,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+        ignore_duplicates: bool = False,
+    ) -> list:
+        """Insert rows; with ignore_duplicates, rows hitting `on_conflict` are skipped"""
+        prefer = ["return=representation" if returning else "return=minimal"]
+        if ignore_duplicates:
+            prefer.append("resolution=ignore-duplicates")
+        elif upsert:
+            prefer.append("resolution=merge-duplicates")
+        params = {"on_conflict": on_conflict} if on_conflict else None
+        response = await self._request(
+            name or f"insert {table}", "POST", f"/{table}", params=params, json=rows,
+            headers={"Prefer": ",".join(prefer)}, timeout=timeout,
+        )
+        return response.json() if returning else []
+
+    async def update(
+        self,
+        table: str,
+        values: dict,
+        filters: dict,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> None:
+        await self._request(
+            name or f"update {table}", "PATCH", f"/{table}", params=filters, json=values,
+            headers={"Prefer": "return=minimal"}, timeout=timeout,
+        )
+
+    async def delete(
+        self,
+        table: str,
+        filters: dict,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> int:
+        """Delete matching rows; returns the number of rows removed"""
+        response = await self._request(
+            name or f"delete {table}", "DELETE", f"/{table}", params=filters,
+            headers={"Prefer": "return=minimal,count=exact"}, timeout=timeout,
+        )
+        # Content-Range looks like "*/42"
+        total = response.headers.get("content-range", "").rsplit("/", 1)[-1]
+        return int(total) if total.isdigit() else 0
+
+    async def rpc(
+        self,
+        function: str,
+        params: Optional[dict] = None,
+        name: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        response = await self._request(
+            name or f"rpc {function}", "POST", f"/rpc/{function}", json=params or {}, timeout=timeout,
+        )
+        return response.json() if response.content else None
+
+
+# Shared DAO for all async routes
+db = SupabaseDAO()
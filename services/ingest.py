@@ -0,0 +1,223 @@
+# Batched ingest pipeline for /mesh/backend telemetry
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Callable, Optional
+
+from services.mac_cache import mac_resolver
+from services.timeseries import timeseries_store
+from services.live_feed import live_feed
+from services.spool import metrics_spool, IDEMPOTENCY_KEY
+from services.rollups import rollup_aggregator
+from services.instrumentation import ingest_lag, record_error, track_query
+
+logger = logging.getLogger(__name__)
+
+# Pipeline tuning from .env
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+INGEST_FLUSH_INTERVAL = float(os.getenv("INGEST_FLUSH_INTERVAL", 1.0))
+INGEST_ENQUEUE_TIMEOUT = float(os.getenv("INGEST_ENQUEUE_TIMEOUT", 0.05))
+# Write batches to the local spool (and let its drainer talk to Supabase)
+# instead of inserting straight from the writer thread
+INGEST_USE_SPOOL = os.getenv("INGEST_USE_SPOOL", "true").lower() == "true"
+
+# Reading keys used by the pipeline itself and never written to the table
+LOCAL_KEYS = {"mac", "received_at"}
+
+
+class MetricsIngestPipeline:
+    """Bounded queue between the MQTT network thread and a bulk writer thread.
+
+    The MQTT callback only calls submit(); the writer thread resolves MACs and
+    hands performance_metrics rows to the spool (or inserts them directly)
+    in bulk once a batch fills up or the flush interval elapses.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        resolver=None,
+        timeseries=None,
+        spool=None,
+        rollups=None,
+        maxsize: int = INGEST_QUEUE_SIZE,
+        batch_size: int = INGEST_BATCH_SIZE,
+        flush_interval: float = INGEST_FLUSH_INTERVAL,
+        enqueue_timeout: float = INGEST_ENQUEUE_TIMEOUT,
+    ):
+        self._client = client
+        self.resolver = resolver if resolver is not None else mac_resolver
+        self.timeseries = timeseries or timeseries_store
+        self.spool = spool or (metrics_spool if INGEST_USE_SPOOL else None)
+        self.rollups = rollups or rollup_aggregator
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # Called with (rows, received) after each flush, e.g. to relay them to other workers' live views
+        self.relay: Optional[Callable[[list, list], None]] = None
+        self.stats = {
+            "enqueued": 0,
+            "overflow": 0,    # queue was full, submit had to wait
+            "dropped": 0,     # queue stayed full for enqueue_timeout
+            "flushed": 0,
+            "batches": 0,
+            "unknown_mac": 0,
+            "deferred": 0,    # spooled by MAC while the node lookup was failing
+            "failed": 0,
+        }
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.supabase_client import get_supabase
+            self._client = get_supabase()
+        return self._client
+
+    def _count(self, key: str, n: int = 1):
+        with self._lock:
+            self.stats[key] += n
+
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, reading: dict) -> bool:
+        """Enqueue one decoded reading; returns False if it was dropped"""
+        try:
+            self._queue.put_nowait(reading)
+        except queue.Full:
+            # Backpressure: give the writer a brief chance to catch up, then drop
+            self._count("overflow")
+            try:
+                self._queue.put(reading, timeout=self.enqueue_timeout)
+            except queue.Full:
+                self._count("dropped")
+                return False
+        self._count("enqueued")
+        return True
+
+    # ======== WRITER =========
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-ingest", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the writer after flushing whatever is still queued"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(remaining, 0.01)))
+            except queue.Empty:
+                pass
+
+            if len(batch) >= self.batch_size or time.monotonic() >= deadline:
+                if batch:
+                    self._flush(batch)
+                    batch = []
+                deadline = time.monotonic() + self.flush_interval
+
+            if self._stop.is_set() and self._queue.empty():
+                if batch:
+                    self._flush(batch)
+                return
+
+    def _resolve(self, batch: list) -> tuple:
+        """(node_ids, MACs to resolve later); the latter only when the lookup fails and a spool can hold them"""
+        try:
+            return self.resolver.resolve_many(r["mac"] for r in batch), set()
+        except Exception as e:
+            if self.spool is None:
+                raise
+            logger.warning(f"MAC lookup failed, spooling uncached readings for the drainer to resolve: {e}")
+            resolved, missing = self.resolver.resolve_cached(r["mac"] for r in batch)
+            return resolved, set(missing)
+
+    def _flush(self, batch: list):
+        try:
+            node_ids, pending = self._resolve(batch)
+
+            rows = []
+            received = []
+            unresolved = []
+            for reading in batch:
+                node_id = node_ids.get(reading["mac"])
+                if node_id is None:
+                    if reading["mac"] in pending:
+                        # Keeps "mac"; the spool drainer resolves it once Supabase is back
+                        unresolved.append({k: v for k, v in reading.items() if k != "received_at"})
+                    else:
+                        self._count("unknown_mac")
+                    continue
+                row = {k: v for k, v in reading.items() if k not in LOCAL_KEYS}
+                row["node_id"] = node_id
+                rows.append(row)
+                received.append(reading.get("received_at"))
+
+            if unresolved:
+                self.spool.append_many(unresolved)
+                self._count("deferred", len(unresolved))
+            if rows and self.spool is not None:
+                self.spool.append_many(rows)
+            elif rows:
+                with track_query("insert performance_metrics"):
+                    self.client.table("performance_metrics").upsert(
+                        rows, on_conflict=IDEMPOTENCY_KEY, ignore_duplicates=True, returning="minimal"
+                    ).execute()
+            self._count("flushed", len(rows))
+            self._count("batches")
+            logger.debug(f"Flushed {len(rows)} performance_metrics rows")
+        except Exception as e:
+            self._count("failed", len(batch))
+            record_error("ingest", e)
+            logger.error(f"Failed to flush {len(batch)} metrics: {e}")
+            return
+
+        self._feed_live(rows, received)
+
+    def _feed_live(self, rows: list, received: list):
+        """Hand stored rows to the in-memory live views and rollups"""
+        now = time.time()
+        for row, ts in zip(rows, received):
+            if ts is not None:
+                ingest_lag.observe(now - ts)
+            try:
+                self.rollups.add_row(row["node_id"], row, ts)
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Skipping rollup sample for node {row['node_id']}: {e}")
+        self.feed_live_views(rows, received)
+        if self.relay is not None and rows:
+            try:
+                self.relay(rows, received)
+            except Exception as e:
+                logger.warning(f"Failed to relay {len(rows)} rows to the other workers: {e}")
+
+    def feed_live_views(self, rows: list, received: list):
+        """Timeseries window and live stream only; also fed with rows relayed from other workers"""
+        for row, ts in zip(rows, received):
+            try:
+                self.timeseries.append_row(row["node_id"], row, ts)
+            except (TypeError, ValueError) as e:
+                logger.debug(f"Skipping live sample for node {row['node_id']}: {e}")
+        live_feed.publish_many(rows)
+
+
+# Shared pipeline used by the MQTT listener
+ingest_pipeline = MetricsIngestPipeline()
@@ -2,9 +2,12 @@
 import logging
 import re
 from typing import Optional
-from services.mqtt_client import mqtt_mac_cache
-from services.supabase_client import supabase
+from services.mac_cache import mqtt_mac_cache
+from services.db import db, eq, DatabaseError
+from services import oauth
+from hash import hashed, HashPoolBusy
 from fastapi import HTTPException
+from fastapi.responses import RedirectResponse
 
 logger = logging.getLogger(__name__)
 
@@ -65,8 +68,65 @@ def get_available_node() -> tuple[Optional[str], Optional[str], Optional[str]]:
 async def check_username_exists(username: str) -> bool:
     """Check if username already exists in database"""
     try:
-        result = supabase.table("user_accounts").select("username").eq("username", username).limit(1).execute()
-        return bool(result.data)
-    except Exception as e:
+        rows = await db.select("user_accounts", "username", {"username": eq(username)}, limit=1, name="username exists")
+        return bool(rows)
+    except DatabaseError as e:
         logger.error(f"Error checking username existence: {e}")
         raise HTTPException(status_code=500, detail="Database error occurred")
+
+def validate_login_input(username: str, password: str) -> tuple[bool, Optional[str]]:
+    """Validate that login form fields are present and sane"""
+    if not username or not username.strip():
+        return False, "Username is required"
+
+    if not password:
+        return False, "Password is required"
+
+    if len(username.strip()) > 50 or len(password) > 128:
+        return False, "Invalid username or password"
+
+    return True, None
+
+async def authenticate_user(username: str, password: str) -> tuple[Optional[dict], Optional[str]]:
+    """Load the user account and verify the password"""
+    username = username.strip().lower()
+    try:
+        rows = await db.select("user_accounts", "*", {"username": eq(username)}, limit=1, name="login user")
+    except DatabaseError as e:
+        logger.error(f"Error loading user {username}: {e}")
+        return None, "Login failed. Please try again later."
+
+    try:
+        valid = bool(rows) and await hashed.verify_async(password, rows[0].get("password_hash") or "")
+    except HashPoolBusy:
+        logger.warning(f"Password verification queue full, rejecting login for {username}")
+        return None, "The server is busy. Please try again in a moment."
+
+    if not valid:
+        logger.warning(f"Invalid credentials for username: {username}")
+        return None, "Invalid username or password"
+
+    return rows[0], None
+
+def create_user_token(user: dict) -> str:
+    """Create the access token stored in the session cookie"""
+    return oauth.create_access_token({
+        "sub": user["username"],
+        "role": user["role"],
+        "user_id": user.get("user_id", user.get("id")),
+        "node_id": user.get("node_id")
+    })
+
+def create_secure_cookie_response(redirect_url: str, token: str, secure: bool = False, samesite: str = "lax") -> RedirectResponse:
+    """Redirect response carrying the access token as an HTTP-only cookie"""
+    response = RedirectResponse(redirect_url, status_code=302)
+    response.set_cookie(
+        key="access_token",
+        value=token,
+        max_age=oauth.ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+        path="/",
+        httponly=True,
+        secure=secure,
+        samesite=samesite
+    )
+    return response
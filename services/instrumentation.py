@@ -0,0 +1,289 @@
+# In-process metrics registry rendered in the Prometheus text format
+import bisect
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key: Iterable, extra: Optional[tuple] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        f'{k}="' + str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for k, v in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._lock = threading.Lock()
+        self._values: dict = {}
+
+    def header(self) -> list:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> list:
+        with self._lock:
+            items = list(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, help)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        with self._lock:
+            items = [(k, list(counts), total, count) for k, (counts, total, count) in self._values.items()]
+        lines = self.header()
+        for key, counts, total, count in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(float(bound))))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class Registry:
+    """Metrics recorded inline plus collectors read at scrape time.
+
+    Collectors return (name, kind, help, [(labels, value), ...]) tuples and
+    let existing stats dicts be exported without touching their hot paths.
+    """
+
+    def __init__(self):
+        self._metrics: dict = {}
+        self._collectors: list = []
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name: str, help: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help, **kwargs)
+            return metric
+
+    def counter(self, name: str, help: str) -> Counter:
+        return self._get(Counter, name, help)
+
+    def gauge(self, name: str, help: str) -> Gauge:
+        return self._get(Gauge, name, help)
+
+    def histogram(self, name: str, help: str, buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help, buckets=buckets)
+
+    def collector(self, fn: Callable[[], list]):
+        self._collectors.append(fn)
+        return fn
+
+    def render(self) -> str:
+        lines = []
+        for metric in list(self._metrics.values()):
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.warning(f"Metrics collector {collect.__name__} failed: {e}")
+                continue
+            for name, kind, help, samples in families:
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# ======== INLINE METRICS =========
+
+http_requests = registry.counter("nodewave_http_requests_total", "HTTP requests by route, method and status")
+http_seconds = registry.histogram("nodewave_http_request_seconds", "HTTP request latency by route")
+mqtt_messages = registry.counter("nodewave_mqtt_messages_total", "MQTT messages received by topic")
+mqtt_seconds = registry.histogram("nodewave_mqtt_message_seconds", "Time spent in on_message by topic")
+mqtt_connected = registry.gauge("nodewave_mqtt_connected", "1 while the MQTT client is connected")
+errors = registry.counter("nodewave_errors_total", "Errors by component and exception type")
+db_seconds = registry.histogram("nodewave_db_query_seconds", "Supabase call latency by query name")
+hash_seconds = registry.histogram(
+    "nodewave_hash_seconds", "bcrypt hash/verify latency", buckets=(0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0, 5.0)
+)
+template_seconds = registry.histogram("nodewave_template_render_seconds", "Jinja render time by template")
+ingest_lag = registry.histogram(
+    "nodewave_ingest_lag_seconds", "MQTT receipt to stored/spooled row",
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+)
+
+
+def record_error(component: str, exc: BaseException):
+    errors.inc(component=component, type=type(exc).__name__)
+
+
+@contextmanager
+def track_query(name: str):
+    """Time one Supabase call made through the sync client"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        record_error("db", e)
+        raise
+    finally:
+        db_seconds.observe(time.perf_counter() - started, query=name)
+
+
+def instrument_templates(templates):
+    """Time every TemplateResponse rendered by a Jinja2Templates instance"""
+    render = templates.TemplateResponse
+
+    def TemplateResponse(*args, **kwargs):
+        # Accepts both (name, context) and the newer (request, name, context)
+        name = kwargs.get("name") or next((a for a in args if isinstance(a, str)), "unknown")
+        with template_seconds.time(template=name):
+            return render(*args, **kwargs)
+
+    templates.TemplateResponse = TemplateResponse
+    return templates
+
+
+async def timing_middleware(request, call_next):
+    """FastAPI http middleware; labels by route template to keep cardinality low"""
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    except Exception as e:
+        record_error("http", e)
+        raise
+    finally:
+        route = request.scope.get("route")
+        path = getattr(route, "path", "unmatched")
+        http_seconds.observe(time.perf_counter() - started, route=path)
+        http_requests.inc(route=path, method=request.method, status=status)
+
+
+# ======== COLLECTORS =========
+
+def _stats_family(name: str, help: str, stats: dict, label: str = "stat", kind: str = "gauge", **labels) -> tuple:
+    return (name, kind, help, [({**labels, label: k}, v) for k, v in stats.items() if isinstance(v, (int, float))])
+
+
+@registry.collector
+def collect_ingest() -> list:
+    from services.ingest import ingest_pipeline
+    families = [
+        _stats_family("nodewave_ingest_events", "Ingest pipeline counters", ingest_pipeline.stats),
+        ("nodewave_ingest_queue_depth", "gauge", "Readings waiting for the writer", [({}, ingest_pipeline.depth())]),
+        _stats_family("nodewave_rollup_events", "Rollup aggregator counters", ingest_pipeline.rollups.stats),
+        ("nodewave_rollup_open_buckets", "gauge", "Rollup buckets in memory", [({}, ingest_pipeline.rollups.open_buckets())]),
+    ]
+    if ingest_pipeline.spool is not None:
+        families.append(_stats_family("nodewave_spool", "Spool depth, lag and counters", ingest_pipeline.spool.snapshot()))
+    return families
+
+
+@registry.collector
+def collect_mqtt() -> list:
+    from services.mqtt__publisher import command_publisher
+    from services.node_status import node_status
+    families = [
+        _stats_family("nodewave_command_publisher", "Command publisher counters", command_publisher.stats),
+        _stats_family("nodewave_node_status", "Node status tracker counters", node_status.stats),
+    ]
+    # Only when the listener is loaded; a scrape shouldn't create the client
+    listener = sys.modules.get("services.mqtt_client")
+    if listener is not None:
+        families.append(_stats_family(
+            "nodewave_mqtt_rejects", "MQTT messages rejected by reason", dict(listener.reject_counts), "reason", "counter"
+        ))
+    return families
+
+
+@registry.collector
+def collect_caches() -> list:
+    from hash import hash_stats
+    from services.mac_cache import mac_resolver
+    from services.oauth import token_cache_stats
+    from services.rate_limit import limiter_stats
+    from services.live_feed import live_feed
+    from services.pages import page_cache
+    families = [
+        _stats_family("nodewave_mac_cache", "MAC resolver cache counters", mac_resolver.snapshot()),
+        _stats_family("nodewave_token_cache", "JWT verification cache counters", token_cache_stats),
+        _stats_family("nodewave_hash_pool", "bcrypt pool counters", hash_stats),
+        _stats_family("nodewave_live_feed", "Live dashboard feed counters", live_feed.stats),
+        _stats_family("nodewave_page_cache", "Rendered page cache counters", page_cache.stats),
+    ]
+    # One family for all limiters; repeated HELP/TYPE lines are invalid
+    samples = []
+    for name, stats in limiter_stats().items():
+        samples += _stats_family("nodewave_rate_limit", "", stats, limiter=name)[3]
+    families.append(("nodewave_rate_limit", "gauge", "Rate limiter counters", samples))
+    return families
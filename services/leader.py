@@ -0,0 +1,79 @@
+# Single-leader election between backend workers on one host
+import fcntl
+import logging
+import os
+import threading
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+LEADER_LOCK_PATH = os.getenv("LEADER_LOCK_PATH", "/tmp/nodewave-backend-leader.lock")
+LEADER_RETRY_SECONDS = float(os.getenv("LEADER_RETRY_SECONDS", 5))
+
+
+class LeaderElection:
+    """Exclusive flock on a shared file; whoever holds it is the leader.
+
+    The OS drops the lock when the holding process dies, and a follower
+    polling every `retry_seconds` takes over.
+    """
+
+    def __init__(
+        self,
+        path: str = LEADER_LOCK_PATH,
+        retry_seconds: float = LEADER_RETRY_SECONDS,
+        on_elected: Optional[Callable[[], None]] = None,
+        on_released: Optional[Callable[[], None]] = None,
+    ):
+        self.path = path
+        self.retry_seconds = retry_seconds
+        self.on_elected = on_elected
+        self.on_released = on_released
+        self._fd: Optional[int] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        if self._fd is not None:
+            return True
+        fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._fd = fd
+        logger.info(f"Process {os.getpid()} elected leader")
+        if self.on_elected:
+            self.on_elected()
+        return True
+
+    def start(self):
+        if self.try_acquire() or (self._thread and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="leader-election", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.retry_seconds):
+            try:
+                if self.try_acquire():
+                    return
+            except OSError as e:
+                logger.error(f"Leader election failed: {e}")
+
+    def release(self):
+        self._stop.set()
+        if self._fd is not None:
+            if self.on_released:
+                self.on_released()
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
@@ -0,0 +1,113 @@
+# Fan-out of decoded telemetry to connected dashboard streams
+import asyncio
+import logging
+import os
+import time
+from typing import Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+LIVE_MIN_INTERVAL = float(os.getenv("LIVE_MIN_INTERVAL", 1.0))
+LIVE_SLOW_CONSUMER_SECONDS = float(os.getenv("LIVE_SLOW_CONSUMER_SECONDS", 30))
+LIVE_MAX_SUBSCRIBERS = int(os.getenv("LIVE_MAX_SUBSCRIBERS", 500))
+
+
+class LiveSubscriber:
+    """One connected stream: node filter, per-node coalescing and throttling.
+
+    Only the newest event per node is kept, so a client that falls behind
+    gets fresh values instead of a backlog.
+    """
+
+    def __init__(self, node_ids: Optional[set] = None, min_interval: float = LIVE_MIN_INTERVAL):
+        self.node_ids = node_ids
+        self.min_interval = min_interval
+        self.pending: dict = {}
+        self.wake = asyncio.Event()
+        self.closed = False
+        self.last_sent = 0.0
+        self.last_drain = time.monotonic()
+        self.coalesced = 0
+
+    def wants(self, node_id) -> bool:
+        return self.node_ids is None or node_id in self.node_ids
+
+    def offer(self, event: dict):
+        if event["node_id"] in self.pending:
+            self.coalesced += 1
+        self.pending[event["node_id"]] = event
+        self.wake.set()
+
+    async def next_batch(self, timeout: float) -> list:
+        """Wait for events (at most one batch per min_interval); [] on timeout"""
+        self.last_drain = time.monotonic()
+        delay = self.last_sent + self.min_interval - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if not self.pending and not self.closed:
+            try:
+                await asyncio.wait_for(self.wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                return []
+        self.wake.clear()
+        batch = list(self.pending.values())
+        self.pending.clear()
+        self.last_sent = time.monotonic()
+        return batch
+
+
+class LiveBroadcaster:
+    """Bridges the ingest writer thread to asyncio subscribers"""
+
+    def __init__(self, max_subscribers: int = LIVE_MAX_SUBSCRIBERS, slow_after: float = LIVE_SLOW_CONSUMER_SECONDS):
+        self.max_subscribers = max_subscribers
+        self.slow_after = slow_after
+        self._subscribers: set = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"published": 0, "slow_disconnects": 0, "rejected": 0}
+
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, node_ids: Optional[Iterable[int]] = None, min_interval: float = LIVE_MIN_INTERVAL) -> Optional[LiveSubscriber]:
+        """Register a stream on the running loop; None if at capacity"""
+        if len(self._subscribers) >= self.max_subscribers:
+            self.stats["rejected"] += 1
+            return None
+        self._loop = asyncio.get_running_loop()
+        sub = LiveSubscriber(set(node_ids) if node_ids else None, max(min_interval, LIVE_MIN_INTERVAL))
+        self._subscribers.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: LiveSubscriber):
+        self._subscribers.discard(sub)
+
+    def publish_many(self, events: list):
+        """Thread-safe entry point; a no-op while nobody is listening"""
+        if not self._subscribers or self._loop is None or not events:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._dispatch, events)
+        except RuntimeError:
+            # Loop already closed during shutdown
+            pass
+
+    def _dispatch(self, events: list):
+        now = time.monotonic()
+        self.stats["published"] += len(events)
+        for sub in list(self._subscribers):
+            if sub.pending and now - sub.last_drain > self.slow_after:
+                # Stuck writing to a client that stopped reading
+                logger.info("Dropping slow live-metrics consumer")
+                self.stats["slow_disconnects"] += 1
+                sub.closed = True
+                sub.wake.set()
+                self._subscribers.discard(sub)
+                continue
+            for event in events:
+                if sub.wants(event["node_id"]):
+                    sub.offer(event)
+
+
+# Shared broadcaster fed by services.ingest
+live_feed = LiveBroadcaster()
@@ -0,0 +1,231 @@
+# MAC address -> node_id resolver cache
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from services.db import db, in_
+from services.instrumentation import track_query
+
+logger = logging.getLogger(__name__)
+
+MAC_CACHE_SIZE = int(os.getenv("MAC_CACHE_SIZE", 4096))
+MAC_CACHE_TTL = float(os.getenv("MAC_CACHE_TTL", 3600))
+MAC_CACHE_NEGATIVE_TTL = float(os.getenv("MAC_CACHE_NEGATIVE_TTL", 300))
+# Minimum age before a prefix miss may trigger another bulk node read
+MAC_PREFIX_REFRESH = float(os.getenv("MAC_PREFIX_REFRESH", 60))
+PREFIX_LENGTH = 8  # "AA:BB:CC", the OUI
+# MACs per in.(...) lookup; keeps the GET URL a few KB even for a 5000-reading bulk post
+MAC_LOOKUP_CHUNK = int(os.getenv("MAC_LOOKUP_CHUNK", 200))
+
+
+def normalize_mac(mac_address: str) -> str:
+    return (mac_address or "").strip().upper()
+
+
+def mac_prefix(mac_address: str) -> str:
+    return normalize_mac(mac_address)[:PREFIX_LENGTH]
+
+
+class MacResolver:
+    """Write-through LRU cache in front of the node table.
+
+    Entries expire after `ttl` seconds. MACs the database doesn't know are
+    cached as None for `negative_ttl` seconds so an unknown device can't
+    force a query per packet. A separate OUI -> node_id index answers the
+    register flow's prefix match without a LIKE query.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        maxsize: int = MAC_CACHE_SIZE,
+        ttl: float = MAC_CACHE_TTL,
+        negative_ttl: float = MAC_CACHE_NEGATIVE_TTL,
+    ):
+        self._client = client
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[str, tuple[Optional[int], float]]" = OrderedDict()
+        self._prefixes: dict = {}  # OUI -> node_id of the first node seen with it
+        self._prefixes_loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "evictions": 0, "queries": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.supabase_client import get_supabase
+            self._client = get_supabase()
+        return self._client
+
+    def __len__(self):
+        return len(self._entries)
+
+    # ======== CACHE OPS =========
+
+    def _get(self, mac: str):
+        """Return (found, node_id) from cache; caller holds the lock"""
+        entry = self._entries.get(mac)
+        if entry is None:
+            return False, None
+        node_id, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[mac]
+            return False, None
+        self._entries.move_to_end(mac)
+        return True, node_id
+
+    def _set(self, mac: str, node_id: Optional[int]):
+        ttl = self.ttl if node_id is not None else self.negative_ttl
+        self._entries[mac] = (node_id, time.monotonic() + ttl)
+        self._entries.move_to_end(mac)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def put(self, mac_address: str, node_id: Optional[int]):
+        """Write-through update, e.g. after a registration lookup"""
+        with self._lock:
+            self._set(normalize_mac(mac_address), node_id)
+            if node_id is not None:
+                self._prefixes.setdefault(mac_prefix(mac_address), node_id)
+
+    def invalidate(self, mac_address: str):
+        with self._lock:
+            self._entries.pop(normalize_mac(mac_address), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    # ======== LOOKUPS =========
+
+    def resolve(self, mac_address: str) -> Optional[int]:
+        """Return the node_id for a MAC, or None if the node is unknown"""
+        return self.resolve_many([mac_address]).get(normalize_mac(mac_address))
+
+    def _lookup_cached(self, mac_addresses: Iterable[str]):
+        """Split MACs into (resolved, missing) using only the cache"""
+        resolved = {}
+        missing = []
+        with self._lock:
+            for mac in {normalize_mac(m) for m in mac_addresses if m}:
+                found, node_id = self._get(mac)
+                if not found:
+                    self.stats["misses"] += 1
+                    missing.append(mac)
+                elif node_id is None:
+                    self.stats["negative_hits"] += 1
+                else:
+                    self.stats["hits"] += 1
+                    resolved[mac] = node_id
+        return resolved, missing
+
+    def _store(self, missing: list, rows: list, resolved: dict):
+        fetched = {normalize_mac(row["mac_address"]): row["node_id"] for row in rows or []}
+        with self._lock:
+            self.stats["queries"] += 1
+            for mac in missing:
+                node_id = fetched.get(mac)
+                self._set(mac, node_id)
+                if node_id is not None:
+                    resolved[mac] = node_id
+                    self._prefixes.setdefault(mac_prefix(mac), node_id)
+        return resolved
+
+    def resolve_cached(self, mac_addresses: Iterable[str]) -> tuple:
+        """(resolved, missing) from memory only, e.g. while the database is down.
+
+        MACs cached as unknown are in neither.
+        """
+        return self._lookup_cached(mac_addresses)
+
+    def resolve_many(self, mac_addresses: Iterable[str]) -> dict:
+        """Resolve several MACs with one node query per MAC_LOOKUP_CHUNK misses"""
+        resolved, missing = self._lookup_cached(mac_addresses)
+        for start in range(0, len(missing), MAC_LOOKUP_CHUNK):
+            chunk = missing[start:start + MAC_LOOKUP_CHUNK]
+            with track_query("resolve mac"):
+                result = self.client.table("node").select("node_id, mac_address").in_("mac_address", chunk).execute()
+            self._store(chunk, result.data, resolved)
+        return resolved
+
+    async def resolve_async(self, mac_address: str) -> Optional[int]:
+        resolved = await self.resolve_many_async([mac_address])
+        return resolved.get(normalize_mac(mac_address))
+
+    async def resolve_many_async(self, mac_addresses: Iterable[str]) -> dict:
+        """Same as resolve_many, but misses are fetched through the async DAO"""
+        resolved, missing = self._lookup_cached(mac_addresses)
+        for start in range(0, len(missing), MAC_LOOKUP_CHUNK):
+            chunk = missing[start:start + MAC_LOOKUP_CHUNK]
+            rows = await db.select("node", "node_id,mac_address", {"mac_address": in_(chunk)}, name="resolve mac")
+            self._store(chunk, rows, resolved)
+        return resolved
+
+    def warm(self, rows: Optional[list] = None) -> int:
+        """Load every known node in one bulk read; returns the number cached.
+
+        `rows` lets a caller that already read the node table share it.
+        """
+        if rows is None:
+            try:
+                with self._lock:
+                    self.stats["queries"] += 1
+                with track_query("warm mac cache"):
+                    rows = self.client.table("node").select("node_id, mac_address").execute().data
+            except Exception as e:
+                logger.error(f"MAC cache warm-up failed: {e}")
+                return 0
+
+        rows = [row for row in rows or [] if row.get("mac_address")]
+        with self._lock:
+            for row in rows[-self.maxsize:]:
+                self._set(normalize_mac(row["mac_address"]), row["node_id"])
+            self._load_prefixes(rows)
+        logger.info(f"MAC cache warmed with {len(rows)} nodes")
+        return len(rows)
+
+    # ======== PREFIX INDEX =========
+
+    def _load_prefixes(self, rows: list):
+        """Rebuild the OUI index from a full node read; caller holds the lock"""
+        prefixes = {}
+        for row in rows:
+            if row.get("mac_address"):
+                prefixes.setdefault(mac_prefix(row["mac_address"]), row["node_id"])
+        self._prefixes = prefixes
+        self._prefixes_loaded_at = time.monotonic()
+
+    def match_prefix(self, mac_address: str) -> Optional[int]:
+        """node_id of a node sharing the MAC's OUI, from memory only"""
+        with self._lock:
+            return self._prefixes.get(mac_prefix(mac_address))
+
+    async def match_prefix_async(self, mac_address: str) -> Optional[int]:
+        """match_prefix, reloading the index once per MAC_PREFIX_REFRESH on a miss"""
+        node_id = self.match_prefix(mac_address)
+        if node_id is not None or time.monotonic() - self._prefixes_loaded_at < MAC_PREFIX_REFRESH:
+            return node_id
+
+        rows = await db.select("node", "node_id,mac_address", name="node prefixes")
+        with self._lock:
+            self.stats["queries"] += 1
+            self._load_prefixes(rows)
+            return self._prefixes.get(mac_prefix(mac_address))
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "size": len(self._entries), "prefixes": len(self._prefixes)}
+
+
+# Shared resolver for the MQTT and HTTP ingest paths
+mac_resolver = MacResolver()
+
+# Most recently registered MAC -> node_id pairs (used to pick a node at signup);
+# filled by the MQTT listener, read by the HTTP routes
+mqtt_mac_cache = {}
@@ -0,0 +1,162 @@
+# Scheduled retention for performance_metrics, network_logs and rollups
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from services.db import db, eq
+from services.leader import LeaderElection
+
+logger = logging.getLogger(__name__)
+
+MAINTENANCE_INTERVAL = float(os.getenv("MAINTENANCE_INTERVAL", 3600))
+METRICS_RETENTION_DAYS = float(os.getenv("METRICS_RETENTION_DAYS", 7))
+LOGS_RETENTION_DAYS = float(os.getenv("LOGS_RETENTION_DAYS", 30))
+# Compaction: fine rollups expire once coarser ones cover the same period
+ROLLUP_RETENTION_DAYS = {"1m": 14, "5m": 90}
+
+# Rate limits: rows per DELETE, pause between DELETEs, DELETEs per table per run
+MAINTENANCE_BATCH_SIZE = int(os.getenv("MAINTENANCE_BATCH_SIZE", 5000))
+MAINTENANCE_BATCH_PAUSE = float(os.getenv("MAINTENANCE_BATCH_PAUSE", 1.0))
+MAINTENANCE_MAX_BATCHES = int(os.getenv("MAINTENANCE_MAX_BATCHES", 100))
+
+# One worker per host runs the job
+MAINTENANCE_LOCK_PATH = os.getenv("MAINTENANCE_LOCK_PATH", "/tmp/nodewave-backend-maintenance.lock")
+
+
+class RetentionJob:
+    """Deletes expired rows in bounded batches from an asyncio task.
+
+    Each batch looks up the batch-th oldest expired timestamp and deletes
+    everything up to it, so no single DELETE touches more than about
+    batch_size rows. Raw metrics are only pruned inside the span covered by
+    hourly rollups, so nothing is deleted before it has been summarised.
+    """
+
+    def __init__(
+        self,
+        dao=None,
+        interval: float = MAINTENANCE_INTERVAL,
+        batch_size: int = MAINTENANCE_BATCH_SIZE,
+        batch_pause: float = MAINTENANCE_BATCH_PAUSE,
+        max_batches: int = MAINTENANCE_MAX_BATCHES,
+        election: Optional[LeaderElection] = None,
+    ):
+        self.db = dao or db
+        self.interval = interval
+        self.batch_size = batch_size
+        self.batch_pause = batch_pause
+        self.max_batches = max_batches
+        self.election = election or LeaderElection(path=MAINTENANCE_LOCK_PATH)
+        self._task: Optional[asyncio.Task] = None
+        self.last_run: dict = {}
+        self.stats = {"runs": 0, "failed_runs": 0, "pruned": 0}
+
+    async def _rollup_edge(self, direction: str) -> Optional[datetime]:
+        rows = await self.db.select(
+            "metric_rollups", "bucket_start", {"resolution": eq("1h")},
+            order=f"bucket_start.{direction}", limit=1, name="rollup coverage",
+        )
+        return datetime.fromisoformat(rows[0]["bucket_start"]) if rows else None
+
+    async def rollup_watermark(self) -> Optional[datetime]:
+        """End of the newest hourly rollup; raw rows before it are summarised"""
+        newest = await self._rollup_edge("desc")
+        return newest + timedelta(hours=1) if newest else None
+
+    async def rollup_coverage(self) -> Optional[tuple]:
+        """(start of the oldest, end of the newest) hourly rollup.
+
+        Raw rows older than the first rollup (e.g. from before rollups were
+        written) have no summary and are kept.
+        """
+        oldest = await self._rollup_edge("asc")
+        if oldest is None:
+            return None
+        return oldest, await self.rollup_watermark()
+
+    async def prune(
+        self, table: str, column: str, cutoff: datetime, filters: Optional[dict] = None, since: Optional[datetime] = None
+    ) -> int:
+        """Delete rows with since <= column < cutoff, batch by batch; returns rows removed"""
+        filters = filters or {}
+        bounds = [f"{column}.lt.{cutoff.isoformat()}"]
+        if since is not None:
+            bounds.append(f"{column}.gte.{since.isoformat()}")
+        removed = 0
+        for _ in range(self.max_batches):
+            # Timestamp of the batch-th oldest expired row bounds this DELETE
+            boundary = await self.db.select(
+                table, column, {**filters, "and": f"({','.join(bounds)})", "offset": self.batch_size - 1},
+                order=f"{column}.asc", limit=1, name=f"retention boundary {table}",
+            )
+            batch = bounds + [f"{column}.lte.{boundary[0][column]}"] if boundary else bounds
+
+            removed += await self.db.delete(table, {**filters, "and": f"({','.join(batch)})"}, name=f"retention {table}")
+            if not boundary:
+                break
+            await asyncio.sleep(self.batch_pause)
+        return removed
+
+    async def run_once(self) -> dict:
+        """One retention pass; returns rows pruned per table"""
+        now = datetime.now(timezone.utc)
+        started = time.monotonic()
+        pruned = {}
+
+        coverage = await self.rollup_coverage()
+        metrics_cutoff = now - timedelta(days=METRICS_RETENTION_DAYS)
+        if coverage is None:
+            logger.info("No rollups yet, keeping raw performance_metrics")
+        else:
+            first, watermark = coverage
+            pruned["performance_metrics"] = await self.prune(
+                "performance_metrics", "metric_timestamp", min(metrics_cutoff, watermark), since=first
+            )
+
+        pruned["network_logs"] = await self.prune(
+            "network_logs", "created_at", now - timedelta(days=LOGS_RETENTION_DAYS)
+        )
+        for resolution, days in ROLLUP_RETENTION_DAYS.items():
+            pruned[f"metric_rollups:{resolution}"] = await self.prune(
+                "metric_rollups", "bucket_start", now - timedelta(days=days), {"resolution": eq(resolution)}
+            )
+
+        total = sum(pruned.values())
+        self.stats["runs"] += 1
+        self.stats["pruned"] += total
+        self.last_run = {"at": now.isoformat(), "seconds": round(time.monotonic() - started, 2), "pruned": pruned}
+        logger.info(f"Retention pruned {total} rows: {pruned}")
+        return pruned
+
+    async def _run(self):
+        while True:
+            try:
+                if self.election.try_acquire():
+                    await self.run_once()
+            except Exception as e:
+                # Anything else would end the task and stop retention until a
+                # restart; CancelledError isn't an Exception and still stops it
+                self.stats["failed_runs"] += 1
+                logger.exception(f"Retention run failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.election.release()
+
+
+# Shared job, started with the app
+retention_job = RetentionJob()
@@ -0,0 +1,103 @@
+# Bounded SQLite-backed store for mesh messages
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+MESSAGE_DB_PATH = os.getenv("MESSAGE_DB_PATH", "data/messages.db")
+MESSAGE_MAX_COUNT = int(os.getenv("MESSAGE_MAX_COUNT", 100000))
+MESSAGE_MAX_AGE_HOURS = float(os.getenv("MESSAGE_MAX_AGE_HOURS", 72))
+MESSAGE_PAGE_LIMIT = 500
+# Retention runs every N inserts instead of on every write
+PRUNE_EVERY = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    node_id INTEGER NOT NULL,
+    message TEXT NOT NULL,
+    received_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_node_id ON messages (node_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_received_at ON messages (received_at);
+"""
+
+
+class MessageStore:
+    """Append-only message log with count/age retention.
+
+    WAL mode lets every gunicorn worker on the host share the same file,
+    and messages survive restarts.
+    """
+
+    def __init__(
+        self,
+        path: str = MESSAGE_DB_PATH,
+        max_count: int = MESSAGE_MAX_COUNT,
+        max_age_hours: float = MESSAGE_MAX_AGE_HOURS,
+    ):
+        self.path = path
+        self.max_count = max_count
+        self.max_age_seconds = max_age_hours * 3600
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._inserts = 0
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    def add(self, node_id: int, message: str) -> int:
+        with self._lock:
+            with self.conn:
+                cur = self.conn.execute(
+                    "INSERT INTO messages (node_id, message, received_at) VALUES (?, ?, ?)",
+                    (node_id, message, time.time()),
+                )
+            self._inserts += 1
+            if self._inserts % PRUNE_EVERY == 0:
+                self._prune()
+            return cur.lastrowid
+
+    def _prune(self) -> int:
+        with self.conn:
+            by_age = self.conn.execute(
+                "DELETE FROM messages WHERE received_at < ?", (time.time() - self.max_age_seconds,)
+            ).rowcount
+            by_count = self.conn.execute(
+                "DELETE FROM messages WHERE id <= (SELECT MAX(id) FROM messages) - ?", (self.max_count,)
+            ).rowcount
+        return by_age + by_count
+
+    def list(self, since_id: int = 0, limit: int = 100, node_id: Optional[int] = None) -> list:
+        """Messages with id > since_id, oldest first"""
+        limit = max(1, min(limit, MESSAGE_PAGE_LIMIT))
+        query = "SELECT id, node_id, message, received_at FROM messages WHERE id > ?"
+        params: list = [since_id]
+        if node_id is not None:
+            query += " AND node_id = ?"
+            params.append(node_id)
+        query += " ORDER BY id LIMIT ?"
+        params.append(limit)
+        with self._lock:
+            return [dict(row) for row in self.conn.execute(query, params)]
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# Shared store for routes.messages
+message_store = MessageStore()
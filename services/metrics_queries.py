@@ -0,0 +1,94 @@
+# Windowed, keyset-paginated reads over performance_metrics for the dashboard
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from services.db import db, eq
+from services.rollups import rollup_summaries
+
+DASHBOARD_PAGE_SIZE = int(os.getenv("DASHBOARD_PAGE_SIZE", 50))
+DASHBOARD_MAX_WINDOW_MINUTES = int(os.getenv("DASHBOARD_MAX_WINDOW_MINUTES", 30 * 24 * 60))
+# Windows longer than this are summarised from metric_rollups instead of raw rows
+ROLLUP_MIN_WINDOW_MINUTES = int(os.getenv("ROLLUP_MIN_WINDOW_MINUTES", 30))
+
+METRIC_COLUMNS = "node_id,metric_timestamp,signal_strength,latency,data_usage,data_sent,data_received"
+LOG_TIMESTAMP_COLUMN = "created_at"
+
+
+def window_bounds(minutes: int, now: Optional[datetime] = None) -> tuple[datetime, datetime]:
+    minutes = max(1, min(minutes, DASHBOARD_MAX_WINDOW_MINUTES))
+    end = now or datetime.now(timezone.utc)
+    return end - timedelta(minutes=minutes), end
+
+
+def _iso(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else value
+
+
+def _range_filter(column: str, start, end, inclusive_end: bool = False) -> dict:
+    op = "lte" if inclusive_end else "lt"
+    return {"and": f"({column}.gte.{_iso(start)},{column}.{op}.{_iso(end)})"}
+
+
+def _cursor(row: dict) -> str:
+    return f"{row['metric_timestamp']}|{row['node_id']}"
+
+
+def _before_filter(before: str) -> dict:
+    """Rows strictly after the cursor in (metric_timestamp, node_id) desc order.
+
+    (node_id, metric_timestamp) is unique (sql/performance_metrics_idempotency.sql),
+    so rows sharing the boundary timestamp are neither skipped nor repeated.
+    """
+    timestamp, _, node_id = before.partition("|")
+    timestamp = datetime.fromisoformat(timestamp).isoformat()
+    if not node_id:
+        # Cursor from before node_id was part of it
+        return {"or": f'(metric_timestamp.lt."{timestamp}")'}
+    node_id = int(node_id)
+    return {"or": f'(metric_timestamp.lt."{timestamp}",and(metric_timestamp.eq."{timestamp}",node_id.lt.{node_id}))'}
+
+
+async def fetch_metrics_page(
+    start: datetime,
+    end: datetime,
+    before: Optional[str] = None,
+    node_id: Optional[int] = None,
+    limit: int = DASHBOARD_PAGE_SIZE,
+) -> tuple[list, Optional[str]]:
+    """One page of raw rows, newest first; returns (rows, cursor for the next page)"""
+    filters = _range_filter("metric_timestamp", start, end)
+    if before:
+        filters.update(_before_filter(before))
+    if node_id is not None:
+        filters["node_id"] = eq(node_id)
+
+    rows = await db.select(
+        "performance_metrics", METRIC_COLUMNS, filters,
+        order="metric_timestamp.desc,node_id.desc", limit=limit + 1, name="dashboard metrics page",
+    )
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, _cursor(rows[-1])
+    return rows, None
+
+
+async def node_rollups(start: datetime, end: datetime) -> list:
+    """Per-node latest values plus avg/p95 latency and signal over the window.
+
+    Short windows are aggregated by the database (sql/dashboard_node_summary.sql),
+    longer ones are summarised from metric_rollups.
+    """
+    if end - start > timedelta(minutes=ROLLUP_MIN_WINDOW_MINUTES):
+        return await rollup_summaries(start, end)
+    return await db.rpc(
+        "dashboard_node_summary", {"p_start": _iso(start), "p_end": _iso(end)}, name="dashboard node summary",
+    ) or []
+
+
+async def recent_alerts(start: datetime, end: datetime, limit: int = DASHBOARD_PAGE_SIZE) -> list:
+    logs = await db.select(
+        "network_logs", "node_id,event_type", _range_filter(LOG_TIMESTAMP_COLUMN, start, end),
+        order=f"{LOG_TIMESTAMP_COLUMN}.desc", limit=limit, name="dashboard alerts",
+    )
+    return [{"node_id": log["node_id"], "message": log["event_type"]} for log in logs]
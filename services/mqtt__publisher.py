@@ -1,30 +1,204 @@
 # services/mqtt_publisher.py
 import paho.mqtt.client as mqtt
+import asyncio
+import json
+import queue
+import socket
 import ssl
 import os
-from dotenv import load_dotenv
+import threading
+import uuid
+from concurrent.futures import Future
+from typing import Iterable, Optional
 
-load_dotenv()
+from services.instrumentation import mqtt_connected
 
 MQTT_BROKER = os.getenv("MQTT_BROKER")
-MQTT_PORT = int(os.getenv("MQTT_PORT"))
+MQTT_PORT = int(os.getenv("MQTT_PORT", 8883))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
+MQTT_TLS = os.getenv("MQTT_TLS", "true").lower() == "true"
+
+COMMAND_TOPIC = "/mesh/commands"
+PUBLISH_QUEUE_SIZE = int(os.getenv("MQTT_PUBLISH_QUEUE_SIZE", 1000))
+PUBLISH_TIMEOUT = float(os.getenv("MQTT_PUBLISH_TIMEOUT", 10))
+
+
+class CommandPublisher:
+    """Long-lived MQTT connection for outbound commands.
+
+    Commands go onto a bounded outbound queue and a sender thread publishes
+    them once the client is connected, so a broker outage just holds them
+    until paho reconnects. Each publish returns a Future resolved on PUBACK.
+    """
+
+    def __init__(self, topic: str = COMMAND_TOPIC, maxsize: int = PUBLISH_QUEUE_SIZE):
+        self.topic = topic
+        self.client_id: Optional[str] = None
+        self._client: Optional[mqtt.Client] = None
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._connected = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._start_lock = threading.Lock()
+        self._pending: dict = {}      # mid -> Future awaiting PUBACK
+        self._acked_early: set = set()
+        self._sender: Optional[threading.Thread] = None
+        self.stats = {"queued": 0, "published": 0, "rejected": 0, "disconnects": 0}
+
+    # ======== CONNECTION =========
+
+    def start(self):
+        with self._start_lock:
+            if self._client is not None:
+                return
+            if not all([MQTT_BROKER, MQTT_USERNAME, MQTT_PASSWORD]):
+                raise ValueError("Missing required MQTT environment variables")
+
+            # Unique per process so workers don't kick each other off; built here,
+            # not at import, so workers forked from a preloaded app differ too
+            self.client_id = f"Backend-Publisher-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+            client = mqtt.Client(client_id=self.client_id, protocol=mqtt.MQTTv5)
+            client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
+            if MQTT_TLS:
+                client.tls_set(tls_version=ssl.PROTOCOL_TLS)
+            client.reconnect_delay_set(min_delay=1, max_delay=30)
+            client.on_connect = self._on_connect
+            client.on_disconnect = self._on_disconnect
+            client.on_publish = self._on_publish
+
+            # connect_async lets loop_start() handle the initial connect and
+            # every reconnect after that
+            client.connect_async(MQTT_BROKER, MQTT_PORT)
+            client.loop_start()
+            self._client = client
+
+            self._stop.clear()
+            self._sender = threading.Thread(target=self._send_loop, name="mqtt-publisher", daemon=True)
+            self._sender.start()
+            print(f"[MQTT] Publisher {self.client_id} started")
+
+    def stop(self, timeout: float = PUBLISH_TIMEOUT):
+        """Flush queued commands, wait for outstanding acks and disconnect"""
+        if self._client is None:
+            return
+        self._stop.set()
+        if self._sender:
+            self._sender.join(timeout)
+        for fut in list(self._pending.values()):
+            try:
+                fut.result(timeout=timeout)
+            except Exception:
+                pass
+        self._client.loop_stop()
+        self._client.disconnect()
+        self._client = None
+        self._connected.clear()
+        print(f"[MQTT] Publisher stopped, stats: {self.stats}")
+
+    def _on_connect(self, client, userdata, flags, rc, properties=None):
+        if rc == 0:
+            self._connected.set()
+        mqtt_connected.set(1 if rc == 0 else 0, client="publisher")
+        print(f"[MQTT] Publisher connected with result code {rc}")
+
+    def _on_disconnect(self, client, userdata, rc, properties=None):
+        self._connected.clear()
+        mqtt_connected.set(0, client="publisher")
+        self._count("disconnects")
+        print(f"[MQTT] Publisher disconnected with result code {rc}")
+
+    def _on_publish(self, client, userdata, mid):
+        # Runs on the paho thread; the ack can beat _send_loop registering mid
+        with self._lock:
+            fut = self._pending.pop(mid, None)
+            if fut is None:
+                self._acked_early.add(mid)
+                return
+        self._count("published")
+        self._resolve(fut, result=mid)
+
+    # ======== SENDING =========
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    @staticmethod
+    def _resolve(fut: Future, result=None, error: Optional[BaseException] = None):
+        """Complete a future unless its caller already gave up on it"""
+        if fut.done():
+            return
+        if error is not None:
+            fut.set_exception(error)
+        else:
+            fut.set_result(result)
+
+    def _send_loop(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                payload, fut = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            # False when publish_async timed out and cancelled it while queued;
+            # once running it can no longer be cancelled under us
+            if not fut.set_running_or_notify_cancel():
+                continue
+
+            if not self._connected.wait(timeout=PUBLISH_TIMEOUT):
+                self._resolve(fut, error=ConnectionError("MQTT broker unavailable"))
+                continue
+
+            info = self._client.publish(self.topic, payload, qos=1)
+            if info.rc not in (mqtt.MQTT_ERR_SUCCESS, mqtt.MQTT_ERR_NO_CONN):
+                self._resolve(fut, error=ConnectionError(mqtt.error_string(info.rc)))
+                continue
+
+            # QoS1 messages stay in paho's inflight set across reconnects,
+            # so NO_CONN still ends in a PUBACK once the link is back
+            with self._lock:
+                if info.mid in self._acked_early:
+                    self._acked_early.discard(info.mid)
+                    acked = True
+                else:
+                    self._pending[info.mid] = fut
+                    acked = False
+            if acked:
+                self._count("published")
+                self._resolve(fut, result=info.mid)
+
+    def publish(self, command: dict) -> Future:
+        """Queue a command for publishing; the Future resolves on PUBACK"""
+        self.start()
+        fut: Future = Future()
+        try:
+            self._queue.put_nowait((json.dumps(command), fut))
+            self._count("queued")
+        except queue.Full:
+            self._count("rejected")
+            fut.set_exception(BufferError("MQTT publish queue is full"))
+        return fut
+
+    async def publish_async(self, command: dict, timeout: float = PUBLISH_TIMEOUT):
+        """Awaitable publish that never blocks the event loop"""
+        await asyncio.wait_for(asyncio.wrap_future(self.publish(command)), timeout)
+
+    async def publish_many(self, cmd: str, targets: Iterable[str], timeout: float = PUBLISH_TIMEOUT) -> dict:
+        """Fan one command out to many targets; returns target -> error (None on success)"""
+        targets = list(targets)
+        results = await asyncio.gather(
+            *(self.publish_async({"cmd": cmd, "target": target}, timeout) for target in targets),
+            return_exceptions=True,
+        )
+        return {target: (str(r) or type(r).__name__) if isinstance(r, BaseException) else None
+                for target, r in zip(targets, results)}
+
+
+# Shared publisher used by the command routes
+command_publisher = CommandPublisher()
+
 
 def publish_command(command: dict):
-    client = mqtt.Client(client_id="Backend-Publisher", protocol=mqtt.MQTTv5)
-    client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-    client.tls_set(tls_version=ssl.PROTOCOL_TLS)
-
-    client.connect(MQTT_BROKER, MQTT_PORT)
-    client.loop_start()
-
-    import json
-    payload = json.dumps(command)
-
-    result = client.publish("/mesh/commands", payload, qos=1)
-    result.wait_for_publish()
-    print(f"[MQTT] Published to /mesh/commands: {payload}")
-    
-    client.loop_stop()
-    client.disconnect()
+    """Blocking publish for non-async callers"""
+    command_publisher.publish(command).result(timeout=PUBLISH_TIMEOUT)
+    print(f"[MQTT] Published to {COMMAND_TOPIC}: {command}")
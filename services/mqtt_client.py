@@ -1,116 +1,234 @@
 import paho.mqtt.client as mqtt
-from services.supabase_client import supabase
-import json, ssl, os
-from dotenv import load_dotenv
+from services.ingest import ingest_pipeline
+from services.mac_cache import mac_resolver, mqtt_mac_cache
+from services.leader import LeaderElection
+from services.node_status import node_status
+from services.rate_limit import mqtt_limiter
+from services.instrumentation import mqtt_connected, mqtt_messages, mqtt_seconds, record_error, track_query
+from paho.mqtt.subscribeoptions import SubscribeOptions
+from pydantic import BaseModel, ValidationError
+from schemas.metrics_schema import Metrics
+from schemas.mqtt_schema import CacheSyncMessage, LiveRowsMessage, RegistrationMessage
+from collections import Counter
+from typing import Optional, Type
+import json, ssl, os, socket, time, uuid
 
-# Load environment variables
-load_dotenv()
+try:
+    import orjson
+except ImportError:  # optional fast path
+    orjson = None
 
 # MQTT credentials from .env
 MQTT_BROKER = os.getenv('MQTT_BROKER')
 MQTT_PORT = int(os.getenv('MQTT_PORT', 8883))
 MQTT_USERNAME = os.getenv("MQTT_USERNAME")
 MQTT_PASSWORD = os.getenv("MQTT_PASSWORD")
+# Off only for a local plain-text broker, e.g. the load simulator's
+MQTT_TLS = os.getenv("MQTT_TLS", "true").lower() == "true"
+# When set, telemetry is consumed through an MQTTv5 shared subscription so the
+# broker load-balances /mesh/backend across every worker in the group. Required
+# with more than one listener: otherwise each one stores and rolls up every reading
+MQTT_SHARE_GROUP = os.getenv("MQTT_SHARE_GROUP")
 
-# Cache to hold MAC -> node_id mapping
-mqtt_mac_cache = {}
+TELEMETRY_TOPIC = "/mesh/backend"
+REGISTRATION_TOPIC = "nodewave/registration"
+# Leader -> all workers: MAC -> node_id mappings learned from registrations
+CACHE_SYNC_TOPIC = "nodewave/backend/mac-cache"
+# Worker -> all workers: rows each one stored from its share of telemetry, so
+# every worker's live views (/api/dashboard/live, /stream) see the whole mesh.
+# Only used with MQTT_SHARE_GROUP; rollups stay per worker (partial rows)
+LIVE_SYNC_TOPIC = "nodewave/backend/live-rows"
+KNOWN_TOPICS = (TELEMETRY_TOPIC, REGISTRATION_TOPIC, CACHE_SYNC_TOPIC, LIVE_SYNC_TOPIC)
 
-# Create the client globally so it's shared
-mqtt_client = mqtt.Client(client_id="NodeWave-Backend", protocol=mqtt.MQTTv5)
+# Decode with orjson + model_validate instead of pydantic-core's own JSON parser
+MQTT_USE_ORJSON = os.getenv("MQTT_USE_ORJSON", "false").lower() == "true" and orjson is not None
+
+# Statuses read at boot are reused by the first election instead of re-queried
+NODE_STATUS_WARM_MAX_AGE = 60
+# (monotonic time, node rows) from warm_node_caches, until the boot-time election
+_boot_node_rows: Optional[tuple] = None
+
+# One shared client per worker, created on first use; the id is unique per worker
+MQTT_CLIENT_ID: Optional[str] = None
+_mqtt_client: Optional[mqtt.Client] = None
+
+def make_client_id() -> str:
+    # Built in the worker, not at import: under gunicorn --preload (or pid reuse
+    # across containers) hostname-pid alone collides and the broker keeps
+    # kicking the older session
+    return f"NodeWave-Backend-{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+def get_client() -> mqtt.Client:
+    global _mqtt_client, MQTT_CLIENT_ID
+    if _mqtt_client is None:
+        MQTT_CLIENT_ID = make_client_id()
+        _mqtt_client = mqtt.Client(client_id=MQTT_CLIENT_ID, protocol=mqtt.MQTTv5)
+    return _mqtt_client
+
+def telemetry_subscription() -> str:
+    if MQTT_SHARE_GROUP:
+        return f"$share/{MQTT_SHARE_GROUP}/{TELEMETRY_TOPIC}"
+    return TELEMETRY_TOPIC
+
+# ======== LEADERSHIP =========
+# Only the leader handles registration side effects (status writes). The
+# status tracker runs on the leader alone: a follower never sees heartbeats,
+# so its liveness sweep would mark every node inactive.
+
+def on_elected():
+    print(f"[MQTT] {MQTT_CLIENT_ID} is now the registration leader")
+    if _boot_node_rows is not None and time.monotonic() - _boot_node_rows[0] <= NODE_STATUS_WARM_MAX_AGE:
+        node_status.warm(_boot_node_rows[1])
+    else:
+        node_status.warm()
+    node_status.start()
+    if _mqtt_client is not None and _mqtt_client.is_connected():
+        _mqtt_client.subscribe(REGISTRATION_TOPIC)
+
+def on_released():
+    # Flushes the transitions still queued
+    node_status.stop()
+
+leader = LeaderElection(on_elected=on_elected, on_released=on_released)
+
+def publish_cache_update(mac_address: str, node_id: int):
+    get_client().publish(CACHE_SYNC_TOPIC, json.dumps({"mac": mac_address, "node_id": node_id}))
+
+def publish_live_rows(rows: list, received: list):
+    """Ingest relay hook: one message per flushed batch"""
+    get_client().publish(LIVE_SYNC_TOPIC, json.dumps({"rows": rows, "received": received}))
+
+# ======== DECODING =========
+
+# Rejected messages by reason, e.g. {"missing:rssi": 3, "json_invalid": 1}
+reject_counts = Counter()
+
+def decode_message(model: Type[BaseModel], payload: bytes) -> Optional[BaseModel]:
+    """Parse and validate a payload in one pass; counts and returns None on reject"""
+    try:
+        if MQTT_USE_ORJSON:
+            return model.model_validate(orjson.loads(payload))
+        return model.model_validate_json(payload)
+    except ValidationError as e:
+        err = e.errors(include_url=False)[0]
+        loc = ".".join(str(part) for part in err["loc"])
+        reject_counts[f"{err['type']}:{loc}" if loc else err["type"]] += 1
+    except ValueError:
+        # orjson.JSONDecodeError
+        reject_counts["json_invalid"] += 1
+    return None
 
 # ======== CALLBACKS =========
 
 def on_connect(client, userdata, flags, rc, properties=None):
     print(f"[MQTT] Connected with result code {rc}")
-    client.subscribe("nodewave/registration")
-    client.subscribe("/mesh/backend")
+    mqtt_connected.set(1 if rc == 0 else 0, client="listener")
+    client.subscribe(telemetry_subscription())
+    # noLocal: the leader doesn't need its own cache updates echoed back
+    client.subscribe(CACHE_SYNC_TOPIC, options=SubscribeOptions(qos=0, noLocal=True))
+    if MQTT_SHARE_GROUP:
+        # noLocal: this worker already fed its own rows to its live views
+        client.subscribe(LIVE_SYNC_TOPIC, options=SubscribeOptions(qos=0, noLocal=True))
+    if leader.is_leader:
+        client.subscribe(REGISTRATION_TOPIC)
 
 def on_message(client, userdata, msg):
     topic = msg.topic
-    payload = msg.payload.decode()
-    print(f"[MQTT] Raw payload on {topic}: {payload}")
+    started = time.perf_counter()
 
     try:
-        data = json.loads(payload)
-        mac_address = data.get("mac", "").upper()
-
-        if not mac_address:
-            print("[MQTT] No MAC in payload.")
-            return
-
         # Handle backend metrics from ESP
-        if topic == "/mesh/backend":
-            # Lookup node_id by MAC
-            result = supabase.table("node").select("node_id").eq("mac_address", mac_address).limit(1).execute()
-            if not result.data:
-                print(f"[MQTT] MAC {mac_address} not recognized.")
+        # Only decode and enqueue here; the ingest writer resolves the MAC and
+        # bulk-inserts performance_metrics off the paho network thread.
+        if topic == TELEMETRY_TOPIC:
+            reading = decode_message(Metrics, msg.payload)
+            if reading is None:
+                return
+            if not mqtt_limiter.allow(reading.mac_address):
+                reject_counts["rate_limited"] += 1
                 return
 
-            node_id = result.data[0]["node_id"]
-
-            signal = data.get("rssi")
-            latency = data.get("latency_ms")
-            usage = data.get("data_total")
-            timestamp =  data.get("timestamp")
-            sent = data.get("data_sent")
-            recv = data.get("data_received")
+            ingest_pipeline.submit({
+                **reading.to_row(),
+                "mac": reading.mac_address,
+                "received_at": time.time()
+            })
 
-            if None in (signal, latency, usage):
-                print(f"[MQTT] Incomplete metrics for {mac_address}. Skipping insert.")
+        # Handle registration messages from ESP nodes
+        elif topic == REGISTRATION_TOPIC:
+            registration = decode_message(RegistrationMessage, msg.payload)
+            if registration is None:
                 return
+            # Own bucket, so a node's telemetry can't starve its heartbeats
+            if not mqtt_limiter.allow(f"registration:{registration.mac}"):
+                reject_counts["rate_limited"] += 1
+                return
+            mac_address = registration.mac
+            is_active = registration.active
 
-            # Store the performance data
-            supabase.table("performance_metrics").insert({
-                "node_id": node_id,
-                "signal_strength": signal,
-                "latency": latency, 
-                "data_usage": usage,
-                "data_sent" : sent,
-                "data_received" : recv,
-                "metric_timestamp" : timestamp
-            }).execute()
-
-            print(f"[MQTT] Stored data for node {node_id} from MAC {mac_address}")
+            # Lookup MAC through the resolver cache
+            node_id = mac_resolver.resolve(mac_address)
 
-        # Handle registration messages from ESP nodes
-        elif topic == "nodewave/registration":
-            is_active = data.get('active', False)
-    
-    # Lookup MAC in Supabase
-            result = supabase.table("node").select("node_id").eq("mac_address", mac_address).limit(1).execute()
-    
-            if result.data:
-                node_id = result.data[0]["node_id"]
+            if node_id is not None:
+                if mqtt_mac_cache.get(mac_address) != node_id:
+                    publish_cache_update(mac_address, node_id)
+                    print(f"[MQTT] MAC {mac_address} linked to node ID {node_id}")
                 mqtt_mac_cache[mac_address] = node_id  # Cache it
-                print(f"[MQTT] MAC {mac_address} linked to node ID {node_id}")
-                
-                # Update the node's active status
-                supabase.table('node').update({
-                    "status": "active" if is_active else "inactive"
-                }).eq("node_id", node_id).execute()
-
-                print(f"[MQTT] Node {node_id} ({mac_address}) marked as {'active' if is_active else 'inactive'}.")
+
+                # Status is only written on transitions, in batches
+                node_status.observe(node_id, is_active)
             else:
-                print(f"[MQTT] MAC {mac_address} not found in DB (registration failed)")
+                reject_counts["unknown_mac"] += 1
 
+        # Mapping learned by the leader; keeps every worker's cache in step
+        elif topic == CACHE_SYNC_TOPIC:
+            update = decode_message(CacheSyncMessage, msg.payload)
+            if update is None:
+                return
+            mac_resolver.put(update.mac, update.node_id)
+            mqtt_mac_cache[update.mac] = update.node_id
 
+        # Another worker's share of the telemetry, for this worker's live views
+        elif topic == LIVE_SYNC_TOPIC:
+            batch = decode_message(LiveRowsMessage, msg.payload)
+            if batch is None:
+                return
+            ingest_pipeline.feed_live_views([row.model_dump() for row in batch.rows], batch.received)
 
-           
-    except json.JSONDecodeError:
-        print("[MQTT ERROR] Payload was not valid JSON.")
     except Exception as e:
+        record_error("mqtt", e)
         print(f"[MQTT ERROR] {e}")
+    finally:
+        # Known topics only, so a stray publish can't add label values
+        label = topic if topic in KNOWN_TOPICS else "other"
+        mqtt_seconds.observe(time.perf_counter() - started, topic=label)
+        mqtt_messages.inc(topic=label)
 
 
 
 
+def warm_node_caches():
+    """Seed the MAC resolver from one bulk node read; the rows are kept for the status tracker if this worker is elected"""
+    global _boot_node_rows
+    try:
+        with track_query("warm node caches"):
+            rows = mac_resolver.client.table("node").select("node_id, mac_address, status").execute().data
+    except Exception as e:
+        print(f"[MQTT ERROR] Node cache warm-up failed: {e}")
+        return
+    mac_resolver.warm(rows)
+    _boot_node_rows = (time.monotonic(), rows)
+
 def start_mqtt_listener():
+    global _boot_node_rows
     try:
         if not all([MQTT_BROKER, MQTT_USERNAME, MQTT_PASSWORD]):
             raise ValueError("Missing required MQTT environment variables")
         
+        mqtt_client = get_client()
         mqtt_client.username_pw_set(MQTT_USERNAME, MQTT_PASSWORD)
-        mqtt_client.tls_set(tls_version=ssl.PROTOCOL_TLS)
+        if MQTT_TLS:
+            mqtt_client.tls_set(tls_version=ssl.PROTOCOL_TLS)
         
         mqtt_client.on_connect = on_connect
         mqtt_client.on_message = on_message
@@ -120,11 +238,38 @@ def start_mqtt_listener():
         if result != 0:
             raise ConnectionError(f"Failed to connect to MQTT broker: {result}")
             
+        warm_node_caches()
+        if ingest_pipeline.spool is not None:
+            ingest_pipeline.spool.start()
+        if MQTT_SHARE_GROUP:
+            ingest_pipeline.relay = publish_live_rows
+        ingest_pipeline.start()
+        ingest_pipeline.rollups.start()
+        # Starts the status tracker if this worker wins the election
+        leader.start()
+        _boot_node_rows = None
+        if not MQTT_SHARE_GROUP and not leader.is_leader:
+            # Another listener on this host holds the lock, so both consume all telemetry
+            print("[MQTT WARNING] Several listeners without MQTT_SHARE_GROUP: rollup samples will be counted once per worker")
         mqtt_client.loop_start()
         print("[MQTT] Client started successfully")
         
     except Exception as e:
         print(f"[MQTT ERROR] Failed to start: {e}")
         raise
-def on_disconnect(client, userdata, rc):
+def on_disconnect(client, userdata, rc, properties=None):
     print(f"[MQTT] Disconnected with result code {rc}")
+    mqtt_connected.set(0, client="listener")
+
+def stop_mqtt_listener():
+    if _mqtt_client is not None:
+        _mqtt_client.loop_stop()
+        _mqtt_client.disconnect()
+    # Stops the status tracker on the leader, flushing its queued transitions
+    leader.release()
+    # Flush whatever telemetry is still queued before exiting
+    ingest_pipeline.stop()
+    ingest_pipeline.rollups.stop()
+    if ingest_pipeline.spool is not None:
+        ingest_pipeline.spool.stop()
+    print(f"[MQTT] Listener stopped, ingest stats: {ingest_pipeline.stats}")
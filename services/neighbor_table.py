@@ -0,0 +1,84 @@
+# Client IP -> MAC resolution from the kernel neighbor (ARP) table
+import logging
+import os
+import threading
+import time
+from typing import Optional
+
+from services.mac_cache import normalize_mac
+
+logger = logging.getLogger(__name__)
+
+ARP_TABLE_PATH = os.getenv("ARP_TABLE_PATH", "/proc/net/arp")
+# Full re-read interval, and the minimum gap between re-reads forced by misses
+NEIGHBOR_TABLE_TTL = float(os.getenv("NEIGHBOR_TABLE_TTL", 30))
+NEIGHBOR_MISS_REFRESH = float(os.getenv("NEIGHBOR_MISS_REFRESH", 1.0))
+
+ATF_COM = 0x2  # entry is complete (the MAC is known)
+
+
+def parse_arp_table(text: str) -> dict:
+    """IP -> MAC for the complete entries of a /proc/net/arp dump"""
+    neighbors = {}
+    for line in text.splitlines()[1:]:
+        fields = line.split()
+        if len(fields) < 4:
+            continue
+        ip, _, flags, mac = fields[:4]
+        if int(flags, 16) & ATF_COM and mac != "00:00:00:00:00:00":
+            neighbors[ip] = normalize_mac(mac)
+    return neighbors
+
+
+class NeighborTable:
+    """In-memory copy of the ARP table, answering lookups from a dict.
+
+    The file is re-read every `ttl` seconds, and on a miss at most once per
+    `miss_refresh` seconds, so a registration storm from new clients costs
+    one read per interval rather than one per request.
+    """
+
+    def __init__(self, path: str = ARP_TABLE_PATH, ttl: float = NEIGHBOR_TABLE_TTL, miss_refresh: float = NEIGHBOR_MISS_REFRESH):
+        self.path = path
+        self.ttl = ttl
+        self.miss_refresh = miss_refresh
+        self._neighbors: dict = {}
+        self._loaded_at = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0}
+
+    def refresh(self):
+        try:
+            with open(self.path) as f:
+                neighbors = parse_arp_table(f.read())
+        except OSError as e:
+            logger.error(f"Could not read neighbor table {self.path}: {e}")
+            neighbors = self._neighbors
+        self._neighbors = neighbors
+        self._loaded_at = time.monotonic()
+        self.stats["refreshes"] += 1
+
+    def lookup(self, ip: str) -> Optional[str]:
+        age = time.monotonic() - self._loaded_at
+        if age >= self.ttl:
+            with self._lock:
+                if time.monotonic() - self._loaded_at >= self.ttl:
+                    self.refresh()
+
+        mac = self._neighbors.get(ip)
+        if mac is None and time.monotonic() - self._loaded_at >= self.miss_refresh:
+            with self._lock:
+                if time.monotonic() - self._loaded_at >= self.miss_refresh:
+                    self.refresh()
+            mac = self._neighbors.get(ip)
+
+        self.stats["hits" if mac else "misses"] += 1
+        return mac
+
+
+# Shared table for the register flow
+neighbor_table = NeighborTable()
+
+
+def get_mac_address(client_ip: str) -> Optional[str]:
+    return neighbor_table.lookup(client_ip)
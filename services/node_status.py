@@ -0,0 +1,142 @@
+# Change-only, batched node status writes driven by registration heartbeats
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from typing import Optional
+
+from services.instrumentation import track_query
+
+logger = logging.getLogger(__name__)
+
+NODE_STATUS_FLUSH_INTERVAL = float(os.getenv("NODE_STATUS_FLUSH_INTERVAL", 5))
+# A node with no heartbeat for this long is marked inactive
+NODE_LIVENESS_TIMEOUT = float(os.getenv("NODE_LIVENESS_TIMEOUT", 120))
+
+ACTIVE = "active"
+INACTIVE = "inactive"
+
+
+class NodeStatusTracker:
+    """Remembers the last status written per node and only writes transitions.
+
+    Transitions collect in a dirty map and are flushed every flush interval
+    as one update per status value; the same loop runs the liveness sweep.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        flush_interval: float = NODE_STATUS_FLUSH_INTERVAL,
+        liveness_timeout: float = NODE_LIVENESS_TIMEOUT,
+    ):
+        self._client = client
+        self.flush_interval = flush_interval
+        self.liveness_timeout = liveness_timeout
+        self._status: dict = {}      # node_id -> last known status
+        self._last_seen: dict = {}   # node_id -> monotonic time of last heartbeat
+        self._dirty: dict = {}       # node_id -> status waiting to be written
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.warmed_at: Optional[float] = None
+        self.stats = {"heartbeats": 0, "transitions": 0, "written": 0, "expired": 0, "failed_flushes": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.supabase_client import get_supabase
+            self._client = get_supabase()
+        return self._client
+
+    def warm(self, rows: Optional[list] = None):
+        """Seed known statuses so a restart doesn't rewrite every node"""
+        if rows is None:
+            try:
+                with track_query("warm node status"):
+                    rows = self.client.table("node").select("node_id, status").execute().data
+            except Exception as e:
+                logger.error(f"Node status warm-up failed: {e}")
+                return
+        now = time.monotonic()
+        self.warmed_at = now
+        with self._lock:
+            for row in rows or []:
+                self._status.setdefault(row["node_id"], row.get("status"))
+                # Active nodes get one liveness timeout to report in
+                if row.get("status") == ACTIVE:
+                    self._last_seen.setdefault(row["node_id"], now)
+
+    def _set(self, node_id, status: str):
+        if self._status.get(node_id) != status:
+            self._status[node_id] = status
+            self._dirty[node_id] = status
+            self.stats["transitions"] += 1
+
+    def observe(self, node_id, active: bool):
+        """Record a registration heartbeat; no I/O"""
+        with self._lock:
+            self.stats["heartbeats"] += 1
+            if active:
+                self._last_seen[node_id] = time.monotonic()
+            else:
+                self._last_seen.pop(node_id, None)
+            self._set(node_id, ACTIVE if active else INACTIVE)
+
+    def sweep(self) -> int:
+        """Mark nodes whose heartbeats stopped as inactive"""
+        cutoff = time.monotonic() - self.liveness_timeout
+        with self._lock:
+            expired = [node_id for node_id, seen in self._last_seen.items() if seen < cutoff]
+            for node_id in expired:
+                del self._last_seen[node_id]
+                self._set(node_id, INACTIVE)
+            self.stats["expired"] += len(expired)
+        return len(expired)
+
+    def flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return
+
+        by_status = defaultdict(list)
+        for node_id, status in dirty.items():
+            by_status[status].append(node_id)
+
+        for status, node_ids in by_status.items():
+            try:
+                with track_query("update node status"):
+                    self.client.table("node").update({"status": status}).in_("node_id", node_ids).execute()
+                self.stats["written"] += len(node_ids)
+            except Exception as e:
+                self.stats["failed_flushes"] += 1
+                logger.error(f"Failed to write status {status} for {len(node_ids)} nodes: {e}")
+                with self._lock:
+                    # Retry next round unless a newer transition superseded it
+                    for node_id in node_ids:
+                        self._dirty.setdefault(node_id, status)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.sweep()
+            self.flush()
+        self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="node-status", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+
+
+# Shared tracker; only the registration leader feeds it
+node_status = NodeStatusTracker()
@@ -1,11 +1,33 @@
 from jose import JWTError, jwt
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from fastapi import Request, HTTPException, status
+from typing import Optional
+import hashlib
+import logging
+import os
 import secrets
+import threading
+import time
 
-SECRET_KEY = secrets.token_urlsafe(32) 
+logger = logging.getLogger(__name__)
+
+# Must be the same in every worker, otherwise tokens only validate on the
+# process that issued them
+SECRET_KEY = os.getenv("JWT_SECRET_KEY")
+if not SECRET_KEY:
+    logger.warning("JWT_SECRET_KEY is not set; using a per-process key (tokens won't survive restarts or work across workers)")
+    SECRET_KEY = secrets.token_urlsafe(32)
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # Token valid for 1 hour
 
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 1024))
+
+# sha256(token) -> (payload, exp); only tokens that already passed jwt.decode
+_token_cache: "OrderedDict[bytes, tuple[dict, float]]" = OrderedDict()
+_cache_lock = threading.Lock()
+token_cache_stats = {"hits": 0, "misses": 0}
+
 def create_access_token(data: dict):
     to_encode = data.copy()
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -13,8 +35,69 @@ def create_access_token(data: dict):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 def verify_token(token: str):
+    digest = hashlib.sha256(token.encode()).digest()
+    now = time.time()
+
+    with _cache_lock:
+        cached = _token_cache.get(digest)
+        if cached is not None:
+            payload, exp = cached
+            if exp > now:
+                _token_cache.move_to_end(digest)
+                token_cache_stats["hits"] += 1
+                return dict(payload)
+            del _token_cache[digest]
+        token_cache_stats["misses"] += 1
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        return payload
     except JWTError:
         return None
+
+    exp = payload.get("exp")
+    if exp is not None:
+        with _cache_lock:
+            _token_cache[digest] = (payload, float(exp))
+            while len(_token_cache) > TOKEN_CACHE_SIZE:
+                _token_cache.popitem(last=False)
+    return dict(payload)
+
+# ======== FASTAPI DEPENDENCIES =========
+
+def get_request_token(request: Request) -> Optional[str]:
+    """Token from the access_token cookie or an Authorization: Bearer header"""
+    token = request.cookies.get("access_token")
+    if token:
+        return token
+    scheme, _, credentials = request.headers.get("Authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and credentials:
+        return credentials
+    return None
+
+async def get_current_user(request: Request) -> dict:
+    """Dependency returning the verified token payload, or 401"""
+    token = get_request_token(request)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+
+    payload = verify_token(token)
+    if payload is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid or expired token",
+            headers={"WWW-Authenticate": "Bearer"}
+        )
+    return payload
+
+def require_role(*roles: str):
+    """Dependency factory that also checks the token's role claim"""
+    async def dependency(request: Request) -> dict:
+        user = await get_current_user(request)
+        if user.get("role") not in roles:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Insufficient permissions")
+        return user
+    return dependency
@@ -0,0 +1,78 @@
+# Shared Jinja templates plus rendered-page cache for request-independent pages
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from fastapi import Request
+from fastapi.templating import Jinja2Templates
+from starlette.responses import HTMLResponse, Response
+
+from services.instrumentation import instrument_templates, template_seconds
+from services.static_assets import etag_matches, static_assets
+
+logger = logging.getLogger(__name__)
+
+# Distinct (page, error/success) renders kept; those args come from the query
+# string, so the cache must stay bounded
+PAGE_CACHE_SIZE = int(os.getenv("PAGE_CACHE_SIZE", 256))
+# Pages can change on deploy, so browsers revalidate, and get a 304 when unchanged
+PAGE_CACHE_CONTROL = "no-cache"
+# Rendered at startup
+PRERENDERED_PAGES = ("index.html", "login.html")
+
+templates = instrument_templates(Jinja2Templates(directory="templates"))
+templates.env.globals["static_url"] = static_assets.url
+
+
+class PageCache:
+    """LRU of rendered HTML keyed by template and its (small) context.
+
+    Only for templates that don't read `request`, i.e. output depends on
+    the context values alone. Each entry carries an ETag from its content.
+    """
+
+    def __init__(self, maxsize: int = PAGE_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[tuple, tuple[bytes, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "not_modified": 0, "evictions": 0}
+
+    def render(self, name: str, **context) -> tuple:
+        """(body, etag) for a page; None context values are left out"""
+        context = {k: v for k, v in context.items() if v is not None}
+        key = (name, tuple(sorted(context.items())))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.stats["hits"] += 1
+                return entry
+
+        with template_seconds.time(template=name):
+            body = templates.get_template(name).render(context).encode()
+        entry = (body, f'"{hashlib.sha256(body).hexdigest()[:16]}"')
+        with self._lock:
+            self.stats["misses"] += 1
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+        return entry
+
+    def response(self, request: Request, name: str, **context) -> Response:
+        body, etag = self.render(name, **context)
+        headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            self.stats["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return HTMLResponse(body, headers=headers)
+
+    def warm(self):
+        for name in PRERENDERED_PAGES:
+            self.render(name)
+        logger.info(f"Pre-rendered {len(PRERENDERED_PAGES)} pages")
+
+
+page_cache = PageCache()
@@ -0,0 +1,231 @@
+# Token-bucket rate limiting for the MQTT and HTTP ingest paths
+import asyncio
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from fastapi import HTTPException, status
+
+logger = logging.getLogger(__name__)
+
+# Shared buckets across workers when set, e.g. redis://localhost:6379/0
+REDIS_URL = os.getenv("REDIS_URL")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+# Let every Nth over-limit message through anyway (0 drops them all)
+RATE_LIMIT_SAMPLE_EVERY = int(os.getenv("RATE_LIMIT_SAMPLE_EVERY", 0))
+# Seconds to stay on the local buckets after a Redis error before trying again
+RATE_LIMIT_REDIS_RETRY = float(os.getenv("RATE_LIMIT_REDIS_RETRY", 5))
+
+MQTT_RATE = float(os.getenv("MQTT_RATE_PER_SEC", 2))
+MQTT_BURST = float(os.getenv("MQTT_RATE_BURST", 10))
+HTTP_MESSAGES_RATE = float(os.getenv("HTTP_MESSAGES_RATE_PER_SEC", 5))
+HTTP_MESSAGES_BURST = float(os.getenv("HTTP_MESSAGES_RATE_BURST", 20))
+# One credential is shared by the whole fleet, so this is effectively a global cap
+HTTP_CREDENTIAL_RATE = float(os.getenv("HTTP_CREDENTIAL_RATE_PER_SEC", 100))
+HTTP_CREDENTIAL_BURST = float(os.getenv("HTTP_CREDENTIAL_RATE_BURST", 200))
+HTTP_METRICS_RATE = float(os.getenv("HTTP_METRICS_RATE_PER_SEC", 2))
+HTTP_METRICS_BURST = float(os.getenv("HTTP_METRICS_RATE_BURST", 10))
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets held in a bounded LRU.
+
+    Each key refills at `rate` tokens per second up to `burst`. Keys idle
+    long enough to be full again are equivalent to new ones, so evicting
+    the least recently used key never lets a flooding key through.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, maxsize: int = RATE_LIMIT_MAX_KEYS, sample_every: int = RATE_LIMIT_SAMPLE_EVERY):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self.sample_every = sample_every
+        self._buckets: "OrderedDict[str, tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"allowed": 0, "limited": 0, "sampled": 0}
+
+    def _take(self, key: str, cost: float, now: float) -> bool:
+        with self._lock:
+            tokens, last = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed
+
+    def _count(self, allowed: bool) -> bool:
+        with self._lock:
+            if allowed:
+                self.stats["allowed"] += 1
+                return True
+            self.stats["limited"] += 1
+            if self.sample_every and self.stats["limited"] % self.sample_every == 0:
+                self.stats["sampled"] += 1
+                return True
+        return False
+
+    def allow(self, key, cost: float = 1) -> bool:
+        """Take `cost` tokens from the key's bucket; False means drop"""
+        return self._count(self._take(str(key), cost, time.monotonic()))
+
+    async def allow_async(self, key, cost: float = 1) -> bool:
+        return self.allow(key, cost)
+
+    def allow_many(self, keys, cost: float = 1) -> list:
+        """allow() for each key, in order"""
+        return [self.allow(key, cost) for key in keys]
+
+    async def allow_many_async(self, keys, cost: float = 1) -> list:
+        return self.allow_many(keys, cost)
+
+    def retry_after(self, cost: float = 1) -> int:
+        """Seconds until an empty bucket holds `cost` tokens again"""
+        return max(1, int(cost / self.rate + 0.999)) if self.rate else 60
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "keys": len(self._buckets)}
+
+
+# Refill and take atomically on the server; returns 1 when allowed
+REDIS_TOKEN_BUCKET = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate, burst, now, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return allowed
+"""
+
+
+class RedisTokenBucketLimiter(TokenBucketLimiter):
+    """Same buckets kept in Redis so every worker shares them.
+
+    Falls back to the in-process buckets while Redis is unreachable, and
+    after a failure stays on them for `retry_after_error` seconds so a dead
+    server costs one timeout per window rather than one per call.
+    `client` can be any object with redis-py's eval() and pipeline(), e.g.
+    a fake in tests.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float, client=None, url: Optional[str] = REDIS_URL,
+                 retry_after_error: float = RATE_LIMIT_REDIS_RETRY, **kwargs):
+        super().__init__(name, rate, burst, **kwargs)
+        self._client = client
+        self.url = url
+        self.retry_after_error = retry_after_error
+        self._open_until = 0.0
+        self.stats["redis_errors"] = 0
+        self.stats["redis_skipped"] = 0
+
+    @property
+    def client(self):
+        if self._client is None:
+            import redis
+            self._client = redis.Redis.from_url(self.url, socket_timeout=0.05)
+        return self._client
+
+    def _circuit_open(self) -> bool:
+        with self._lock:
+            if time.monotonic() < self._open_until:
+                self.stats["redis_skipped"] += 1
+                return True
+        return False
+
+    def _redis_failed(self, e: Exception):
+        with self._lock:
+            self.stats["redis_errors"] += 1
+            self._open_until = time.monotonic() + self.retry_after_error
+        logger.warning(f"Redis rate limit check failed, using local buckets for {self.retry_after_error}s: {e}")
+
+    def _eval_args(self, key, cost: float, now: float) -> tuple:
+        return REDIS_TOKEN_BUCKET, 1, f"ratelimit:{self.name}:{key}", self.rate, self.burst, now, cost
+
+    def allow(self, key, cost: float = 1) -> bool:
+        return self.allow_many([key], cost)[0]
+
+    def allow_many(self, keys, cost: float = 1) -> list:
+        """One pipelined round trip for the whole batch"""
+        keys = [str(key) for key in keys]
+        if not keys:
+            return []
+        results = None
+        if not self._circuit_open():
+            try:
+                if len(keys) == 1:
+                    results = [self.client.eval(*self._eval_args(keys[0], cost, time.time()))]
+                else:
+                    pipe = self.client.pipeline(transaction=False)
+                    now = time.time()
+                    for key in keys:
+                        pipe.eval(*self._eval_args(key, cost, now))
+                    results = pipe.execute()
+            except Exception as e:
+                self._redis_failed(e)
+        if results is None:
+            now = time.monotonic()
+            results = [self._take(key, cost, now) for key in keys]
+        return [self._count(bool(allowed)) for allowed in results]
+
+    async def allow_async(self, key, cost: float = 1) -> bool:
+        # redis-py is blocking; keep the round trip off the event loop
+        return await asyncio.to_thread(self.allow, key, cost)
+
+    async def allow_many_async(self, keys, cost: float = 1) -> list:
+        return await asyncio.to_thread(self.allow_many, list(keys), cost)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {**self.stats, "keys": len(self._buckets), "backend": "redis"}
+
+
+_limiters: dict = {}
+
+
+def make_limiter(name: str, rate: float, burst: float, shared: bool = True) -> TokenBucketLimiter:
+    """Redis-backed when REDIS_URL is set and `shared`, in-process otherwise"""
+    if rate <= 0 or burst <= 0:
+        raise ValueError(f"Rate limiter {name!r} needs a positive rate and burst, got rate={rate} burst={burst}")
+    if REDIS_URL and shared:
+        limiter = RedisTokenBucketLimiter(name, rate, burst)
+    else:
+        limiter = TokenBucketLimiter(name, rate, burst)
+    _limiters[name] = limiter
+    return limiter
+
+
+async def enforce(limiter: TokenBucketLimiter, key, cost: float = 1):
+    """Raise 429 with Retry-After when the key is over its rate"""
+    if not await limiter.allow_async(key, cost):
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded",
+            headers={"Retry-After": str(limiter.retry_after(cost))}
+        )
+
+
+def limiter_stats() -> dict:
+    return {name: limiter.snapshot() for name, limiter in _limiters.items()}
+
+
+# Per-MAC on MQTT, per node and per credential on /api/messages, per MAC on /metrics.
+# MQTT stays in-process: it runs on paho's network thread, which must not wait on Redis
+mqtt_limiter = make_limiter("mqtt", MQTT_RATE, MQTT_BURST, shared=False)
+messages_node_limiter = make_limiter("messages_node", HTTP_MESSAGES_RATE, HTTP_MESSAGES_BURST)
+messages_credential_limiter = make_limiter("messages_credential", HTTP_CREDENTIAL_RATE, HTTP_CREDENTIAL_BURST)
+metrics_limiter = make_limiter("metrics", HTTP_METRICS_RATE, HTTP_METRICS_BURST)
@@ -0,0 +1,360 @@
+# Incremental 1m/5m/1h rollups of telemetry, maintained at ingest time
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Optional
+
+from services.db import db, eq
+from services.instrumentation import track_query
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {"1m": 60, "5m": 300, "1h": 3600}
+ROLLUP_TABLE = "metric_rollups"
+ROLLUP_FLUSH_INTERVAL = float(os.getenv("ROLLUP_FLUSH_INTERVAL", 10))
+# Wait this long after a bucket ends before closing it, for late readings
+ROLLUP_GRACE_SECONDS = float(os.getenv("ROLLUP_GRACE_SECONDS", 15))
+ROLLUP_READ_CHUNK = int(os.getenv("ROLLUP_READ_CHUNK", 1000))
+SKETCH_ACCURACY = 0.02
+
+# Workers consuming a shared subscription each hold part of a node's
+# readings, so every worker writes its own partial row and readers merge.
+# Without MQTT_SHARE_GROUP every listener sees all telemetry, and the merged
+# rows count each reading once per worker: run several listeners only with
+# a share group set.
+
+
+def make_source() -> str:
+    # Built in the worker, not at import: under gunicorn --preload (or pid
+    # reuse across restarts) hostname-pid alone collides, and one process's
+    # partial row would overwrite another's
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class QuantileSketch:
+    """Mergeable log-bucketed histogram (DDSketch-style).
+
+    Quantiles are within SKETCH_ACCURACY relative error, and two sketches
+    merge by adding bucket counts, so partial rollups combine exactly.
+    """
+
+    def __init__(self, accuracy: float = SKETCH_ACCURACY):
+        self.accuracy = accuracy
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive: dict = defaultdict(int)
+        self.negative: dict = defaultdict(int)
+        self.zero = 0
+        self.count = 0
+
+    def _index(self, value: float) -> int:
+        return math.ceil(math.log(value) / self._log_gamma)
+
+    def _value(self, index: int) -> float:
+        return 2 * self.gamma ** index / (self.gamma + 1)
+
+    def add(self, value: float):
+        if value > 0:
+            self.positive[self._index(value)] += 1
+        elif value < 0:
+            self.negative[self._index(-value)] += 1
+        else:
+            self.zero += 1
+        self.count += 1
+
+    def merge(self, other: "QuantileSketch"):
+        for idx, n in other.positive.items():
+            self.positive[idx] += n
+        for idx, n in other.negative.items():
+            self.negative[idx] += n
+        self.zero += other.zero
+        self.count += other.count
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        # Walk from the most negative value up to the largest positive one
+        for idx in sorted(self.negative, reverse=True):
+            seen += self.negative[idx]
+            if seen > rank:
+                return -self._value(idx)
+        seen += self.zero
+        if seen > rank:
+            return 0.0
+        for idx in sorted(self.positive):
+            seen += self.positive[idx]
+            if seen > rank:
+                return self._value(idx)
+        return self._value(max(self.positive)) if self.positive else 0.0
+
+    def to_dict(self) -> dict:
+        return {"a": self.accuracy, "p": dict(self.positive), "n": dict(self.negative), "z": self.zero}
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "QuantileSketch":
+        sketch = cls((data or {}).get("a", SKETCH_ACCURACY))
+        if data:
+            for idx, n in data.get("p", {}).items():
+                sketch.positive[int(idx)] += n
+            for idx, n in data.get("n", {}).items():
+                sketch.negative[int(idx)] += n
+            sketch.zero = data.get("z", 0)
+            sketch.count = sum(sketch.positive.values()) + sum(sketch.negative.values()) + sketch.zero
+        return sketch
+
+
+class MetricStats:
+    """count/sum/min/max/last plus a quantile sketch for one metric"""
+
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.last: Optional[float] = None
+        self.sketch = QuantileSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.last = value
+        self.sketch.add(value)
+
+    def merge(self, other: "MetricStats"):
+        if not other.count:
+            return
+        self.count += other.count
+        self.sum += other.sum
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self.last = other.last
+        self.sketch.merge(other.sketch)
+
+    def to_columns(self, prefix: str) -> dict:
+        return {
+            f"{prefix}_count": self.count,
+            f"{prefix}_sum": self.sum,
+            f"{prefix}_min": self.min,
+            f"{prefix}_max": self.max,
+            f"{prefix}_last": self.last,
+            f"{prefix}_sketch": self.sketch.to_dict(),
+        }
+
+    @classmethod
+    def from_columns(cls, row: dict, prefix: str) -> "MetricStats":
+        stats = cls()
+        stats.count = row.get(f"{prefix}_count") or 0
+        stats.sum = row.get(f"{prefix}_sum") or 0.0
+        stats.min = row.get(f"{prefix}_min")
+        stats.max = row.get(f"{prefix}_max")
+        stats.last = row.get(f"{prefix}_last")
+        stats.sketch = QuantileSketch.from_dict(row.get(f"{prefix}_sketch"))
+        return stats
+
+
+class RollupBucket:
+    def __init__(self):
+        self.latency = MetricStats()
+        self.rssi = MetricStats()
+        self.data_usage_last: Optional[float] = None
+        self.samples = 0
+
+
+class RollupAggregator:
+    """Open buckets per (resolution, node_id, bucket_start) in memory.
+
+    Buckets are written to metric_rollups once they close and are dropped
+    from memory after a successful write.
+    """
+
+    def __init__(self, client=None, flush_interval: float = ROLLUP_FLUSH_INTERVAL, grace: float = ROLLUP_GRACE_SECONDS):
+        self._client = client
+        self.flush_interval = flush_interval
+        self.grace = grace
+        self._buckets: dict = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._source: Optional[str] = None
+        self.stats = {"added": 0, "late": 0, "flushed_buckets": 0, "failed_flushes": 0}
+
+    @property
+    def source(self) -> str:
+        """This writer's partial-row key; new after every stop()"""
+        if self._source is None:
+            self._source = make_source()
+        return self._source
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.supabase_client import get_supabase
+            self._client = get_supabase()
+        return self._client
+
+    def add_row(self, node_id: int, row: dict, ts: Optional[float] = None):
+        """Fold one performance_metrics row into every resolution's bucket"""
+        now = time.time()
+        ts = ts if ts is not None else now
+        latency = row.get("latency")
+        rssi = row.get("signal_strength")
+        with self._lock:
+            for resolution, seconds in RESOLUTIONS.items():
+                key = (resolution, node_id, int(ts // seconds * seconds))
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    if key[2] + seconds + self.grace <= now:
+                        # Its bucket may already be written; a new partial row would overwrite it
+                        self.stats["late"] += 1
+                        continue
+                    bucket = self._buckets[key] = RollupBucket()
+                bucket.samples += 1
+                if latency is not None:
+                    bucket.latency.add(float(latency))
+                if rssi is not None:
+                    bucket.rssi.add(float(rssi))
+                if row.get("data_usage") is not None:
+                    bucket.data_usage_last = row["data_usage"]
+            self.stats["added"] += 1
+
+    def _to_row(self, key: tuple, bucket: RollupBucket) -> dict:
+        resolution, node_id, start = key
+        return {
+            "node_id": node_id,
+            "resolution": resolution,
+            "bucket_start": datetime.fromtimestamp(start, timezone.utc).isoformat(),
+            "source": self.source,
+            "samples": bucket.samples,
+            "data_usage_last": bucket.data_usage_last,
+            **bucket.latency.to_columns("latency"),
+            **bucket.rssi.to_columns("rssi"),
+        }
+
+    def flush(self, force: bool = False):
+        """Write closed buckets (all buckets when force=True, e.g. on shutdown)"""
+        now = time.time()
+        with self._lock:
+            closed = {
+                key: bucket for key, bucket in self._buckets.items()
+                if force or key[2] + RESOLUTIONS[key[0]] + self.grace <= now
+            }
+        if not closed:
+            return
+
+        try:
+            with track_query("upsert metric_rollups"):
+                self.client.table(ROLLUP_TABLE).upsert(
+                    [self._to_row(key, bucket) for key, bucket in closed.items()],
+                    on_conflict="node_id,resolution,bucket_start,source", returning="minimal"
+                ).execute()
+        except Exception as e:
+            self.stats["failed_flushes"] += 1
+            logger.error(f"Failed to write {len(closed)} rollup buckets: {e}")
+            return
+
+        with self._lock:
+            for key in closed:
+                self._buckets.pop(key, None)
+        self.stats["flushed_buckets"] += len(closed)
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metric-rollups", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush(force=True)
+        # Buckets reopened after a restart must not overwrite the partial rows just written
+        self._source = None
+
+    def open_buckets(self) -> int:
+        with self._lock:
+            return len(self._buckets)
+
+
+# ======== READ SIDE =========
+
+def pick_resolution(window_seconds: float) -> str:
+    """Coarsest resolution that still gives a useful number of points"""
+    if window_seconds <= 6 * 3600:
+        return "1m"
+    if window_seconds <= 3 * 24 * 3600:
+        return "5m"
+    return "1h"
+
+
+async def rollup_summaries(start: datetime, end: datetime) -> list:
+    """Per-node summaries over the window, merged from rollup buckets.
+
+    Same shape as services.metrics_queries.node_rollups. Buckets still open
+    in memory are not included, so the newest minute may be missing.
+    """
+    resolution = pick_resolution((end - start).total_seconds())
+    filters = {
+        "resolution": eq(resolution),
+        "and": f"(bucket_start.gte.{start.isoformat()},bucket_start.lt.{end.isoformat()})",
+    }
+
+    rows, offset = [], 0
+    while True:
+        # Paged because PostgREST caps responses; the order is total so offsets are stable
+        chunk = await db.select(
+            ROLLUP_TABLE, "*", {**filters, "offset": offset},
+            order="bucket_start.asc,node_id.asc,source.asc", limit=ROLLUP_READ_CHUNK,
+            name=f"rollups {resolution}",
+        )
+        rows.extend(chunk)
+        if len(chunk) < ROLLUP_READ_CHUNK:
+            break
+        offset += len(chunk)
+
+    by_node: dict = {}
+    for row in rows:
+        merged = by_node.setdefault(row["node_id"], {
+            "latency": MetricStats(), "rssi": MetricStats(), "samples": 0, "last": row,
+        })
+        merged["latency"].merge(MetricStats.from_columns(row, "latency"))
+        merged["rssi"].merge(MetricStats.from_columns(row, "rssi"))
+        merged["samples"] += row.get("samples") or 0
+        merged["last"] = row
+
+    summaries = []
+    for node_id, merged in sorted(by_node.items()):
+        latency, rssi, last = merged["latency"], merged["rssi"], merged["last"]
+        summaries.append({
+            "node_id": node_id,
+            "samples": merged["samples"],
+            "last_seen": last["bucket_start"],
+            "signal_strength": rssi.last,
+            "latency": latency.last,
+            "data_usage": last.get("data_usage_last"),
+            "latency_avg": latency.sum / latency.count if latency.count else None,
+            "latency_p95": latency.sketch.quantile(0.95),
+            "signal_avg": rssi.sum / rssi.count if rssi.count else None,
+            "signal_p95": rssi.sketch.quantile(0.95),
+        })
+    return summaries
+
+
+# Shared aggregator fed by services.ingest
+rollup_aggregator = RollupAggregator()
@@ -0,0 +1,189 @@
+# Durable local spool for performance_metrics rows on their way to Supabase
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from services.instrumentation import track_query
+from services.mac_cache import mac_resolver, normalize_mac
+
+logger = logging.getLogger(__name__)
+
+SPOOL_PATH = os.getenv("SPOOL_PATH", "data/metrics_spool.db")
+SPOOL_BATCH_SIZE = int(os.getenv("SPOOL_BATCH_SIZE", 500))
+SPOOL_DRAIN_INTERVAL = float(os.getenv("SPOOL_DRAIN_INTERVAL", 1.0))
+SPOOL_MAX_BACKOFF = float(os.getenv("SPOOL_MAX_BACKOFF", 60))
+
+# Replays upsert on this key so a batch that was stored but not acknowledged
+# can be sent again safely (needs sql/performance_metrics_idempotency.sql)
+IDEMPOTENCY_KEY = "node_id,metric_timestamp"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS spool (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    row TEXT NOT NULL,
+    enqueued_at REAL NOT NULL
+);
+"""
+
+
+class MetricsSpool:
+    """Append-only SQLite (WAL) spool with a background drainer.
+
+    The ingest writer appends each batch in one fsync'd transaction; the
+    drainer replays the oldest rows to Supabase in bulk and only deletes
+    them after the upsert succeeds, backing off exponentially on errors.
+    Rows spooled while the node lookup was down carry "mac" instead of
+    node_id and are resolved when drained.
+    """
+
+    def __init__(
+        self,
+        path: str = SPOOL_PATH,
+        client=None,
+        resolver=None,
+        batch_size: int = SPOOL_BATCH_SIZE,
+        drain_interval: float = SPOOL_DRAIN_INTERVAL,
+        max_backoff: float = SPOOL_MAX_BACKOFF,
+    ):
+        self.path = path
+        self._client = client
+        self.resolver = resolver if resolver is not None else mac_resolver
+        self.batch_size = batch_size
+        self.drain_interval = drain_interval
+        self.max_backoff = max_backoff
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._backoff = 0.0
+        self.stats = {"appended": 0, "drained": 0, "failed_batches": 0, "unknown_mac": 0}
+
+    @property
+    def client(self):
+        if self._client is None:
+            from services.supabase_client import get_supabase
+            self._client = get_supabase()
+        return self._client
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if os.path.dirname(self.path):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # fsync on every commit; each commit is a whole batch
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.executescript(SCHEMA)
+            self._conn = conn
+        return self._conn
+
+    # ======== WRITE SIDE =========
+
+    def append_many(self, rows: list):
+        now = time.time()
+        with self._lock, self.conn:
+            self.conn.executemany(
+                "INSERT INTO spool (row, enqueued_at) VALUES (?, ?)",
+                [(json.dumps(row), now) for row in rows],
+            )
+        self.stats["appended"] += len(rows)
+
+    # ======== DRAIN SIDE =========
+
+    def _oldest(self) -> list:
+        with self._lock:
+            return self.conn.execute(
+                "SELECT id, row FROM spool ORDER BY id LIMIT ?", (self.batch_size,)
+            ).fetchall()
+
+    def _resolve(self, rows: list) -> list:
+        """Fill in node_id for rows spooled by MAC; unknown MACs are dropped"""
+        pending = [row["mac"] for row in rows if "node_id" not in row]
+        if not pending:
+            return rows
+        node_ids = self.resolver.resolve_many(pending)
+        resolved = []
+        for row in rows:
+            if "node_id" not in row:
+                node_id = node_ids.get(normalize_mac(row.pop("mac")))
+                if node_id is None:
+                    self.stats["unknown_mac"] += 1
+                    continue
+                row["node_id"] = node_id
+            resolved.append(row)
+        return resolved
+
+    def drain_once(self) -> int:
+        """Send one batch; returns rows taken off the spool (raises on Supabase errors)"""
+        batch = self._oldest()
+        if not batch:
+            return 0
+
+        rows = self._resolve([json.loads(row) for _, row in batch])
+        if rows:
+            with track_query("spool drain"):
+                self.client.table("performance_metrics").upsert(
+                    rows, on_conflict=IDEMPOTENCY_KEY, ignore_duplicates=True, returning="minimal"
+                ).execute()
+
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM spool WHERE id <= ?", (batch[-1][0],))
+        self.stats["drained"] += len(rows)
+        return len(batch)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                # Keep going without sleeping while there's a backlog
+                while self.drain_once() == self.batch_size and not self._stop.is_set():
+                    pass
+                self._backoff = 0.0
+                wait = self.drain_interval
+            except Exception as e:
+                self.stats["failed_batches"] += 1
+                self._backoff = min(max(self._backoff * 2, 1.0), self.max_backoff)
+                wait = self._backoff
+                logger.warning(f"Spool drain failed, retrying in {wait:.0f}s: {e}")
+            self._stop.wait(wait)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="metrics-spool", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Stop the drainer after one last attempt; undrained rows stay on disk"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        try:
+            self.drain_once()
+        except Exception as e:
+            logger.warning(f"Final spool drain failed, rows kept for next start: {e}")
+
+    # ======== METRICS =========
+
+    def depth(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def lag_seconds(self) -> float:
+        """Age of the oldest undrained row"""
+        with self._lock:
+            oldest = self.conn.execute("SELECT MIN(enqueued_at) FROM spool").fetchone()[0]
+        return time.time() - oldest if oldest else 0.0
+
+    def snapshot(self) -> dict:
+        return {**self.stats, "depth": self.depth(), "lag_seconds": self.lag_seconds(), "backoff_seconds": self._backoff}
+
+
+# Shared spool between the ingest writer and Supabase
+metrics_spool = MetricsSpool()
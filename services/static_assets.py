@@ -0,0 +1,154 @@
+# Static files with content-hashed URLs, ETags and precompressed variants
+import gzip
+import hashlib
+import logging
+import mimetypes
+import os
+import threading
+from typing import Optional
+
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional; gzip only without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+STATIC_DIR = os.getenv("STATIC_DIR", "static")
+STATIC_URL_PREFIX = "/static"
+# Hashed URLs change with the content, so they can be cached for good
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Unhashed URLs (old links, bookmarks) must revalidate, which is a cheap 304
+REVALIDATE_CACHE = "public, no-cache"
+# Smaller files aren't worth compressing
+COMPRESS_MIN_BYTES = 256
+
+
+class Asset:
+    def __init__(self, name: str, body: bytes):
+        self.name = name
+        self.body = body
+        self.digest = hashlib.sha256(body).hexdigest()[:12]
+        self.etag = f'"{self.digest}"'
+        self.media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        root, ext = os.path.splitext(name)
+        self.hashed_name = f"{root}.{self.digest}{ext}"
+        # encoding -> body, best first
+        self.encoded: dict = {}
+        if len(body) >= COMPRESS_MIN_BYTES:
+            if brotli is not None:
+                self.encoded["br"] = brotli.compress(body, quality=11)
+            self.encoded["gzip"] = gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def encoding_weights(accept_encoding: str) -> dict:
+    """Accept-Encoding as {coding: q}; q=0 means the client refuses it"""
+    weights = {}
+    for part in accept_encoding.lower().split(","):
+        coding, *params = (p.strip() for p in part.split(";"))
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    q = float(param[2:])
+                except ValueError:
+                    q = 0.0
+        weights[coding] = q
+    return weights
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check with weak comparison; "*" matches any current representation"""
+    if not if_none_match:
+        return False
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags
+
+
+class StaticAssets:
+    """ASGI app for /static, loaded into memory once.
+
+    Templates link through `url(name)`, which returns the content-hashed
+    path; both hashed and plain names are served, with ETag/304 and a
+    gzip or brotli body when the client accepts one.
+    """
+
+    def __init__(self, directory: str = STATIC_DIR, prefix: str = STATIC_URL_PREFIX):
+        self.directory = directory
+        self.prefix = prefix
+        self._assets: Optional[dict] = None   # served name -> Asset
+        self._by_name: dict = {}               # original name -> Asset
+        self._lock = threading.Lock()
+
+    def load(self) -> int:
+        """Read and compress every file; returns the number of assets"""
+        with self._lock:
+            if self._assets is not None:
+                return len(self._by_name)
+            assets, by_name = {}, {}
+            for root, _, files in os.walk(self.directory):
+                for filename in files:
+                    path = os.path.join(root, filename)
+                    name = os.path.relpath(path, self.directory).replace(os.sep, "/")
+                    with open(path, "rb") as f:
+                        asset = Asset(name, f.read())
+                    by_name[name] = asset
+                    assets[name] = assets[asset.hashed_name] = asset
+            self._by_name, self._assets = by_name, assets
+        logger.info(f"Loaded {len(by_name)} static assets from {self.directory}")
+        return len(by_name)
+
+    def url(self, name: str) -> str:
+        """Hashed URL for a template; unknown names fall back to the plain path"""
+        self.load()
+        asset = self._by_name.get(name)
+        return f"{self.prefix}/{asset.hashed_name if asset else name}"
+
+    def response(self, name: str, if_none_match: Optional[str], accept_encoding: str) -> Response:
+        self.load()
+        asset = self._assets.get(name)
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+
+        # Highest q wins; ties go to the better compression (br before gzip)
+        encoding, body, best = None, asset.body, 0.0
+        weights = encoding_weights(accept_encoding)
+        for candidate, encoded in asset.encoded.items():
+            q = weights.get(candidate, weights.get("*", 0.0))
+            if q > best:
+                encoding, body, best = candidate, encoded, q
+
+        # Each encoding is its own representation, so it gets its own strong ETag
+        etag = f'"{asset.digest}-{encoding}"' if encoding else asset.etag
+        headers = {
+            "ETag": etag,
+            "Cache-Control": IMMUTABLE_CACHE if name == asset.hashed_name else REVALIDATE_CACHE,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(if_none_match, etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(body, media_type=asset.media_type, headers=headers)
+
+    async def __call__(self, scope, receive, send):
+        if scope["method"] not in ("GET", "HEAD"):
+            response = Response("Method Not Allowed", status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            headers = {k.decode("latin-1"): v.decode("latin-1") for k, v in scope["headers"]}
+            # Newer Starlette keeps the mount prefix in "path" and puts it in "root_path"
+            path, root = scope["path"], scope.get("root_path", "")
+            if root and path.startswith(root):
+                path = path[len(root):]
+            response = self.response(
+                path.lstrip("/"), headers.get("if-none-match"), headers.get("accept-encoding", "")
+            )
+        await response(scope, receive, send)
+
+
+# Mounted at /static by main.py
+static_assets = StaticAssets()
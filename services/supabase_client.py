@@ -1,9 +1,18 @@
 from supabase import Client, create_client
 from decouple import config
+from typing import Optional
+import threading
 
 
-url = config("SUPABASE_URL")
-key = config("SUPABASE_KEY")
+_client: Optional[Client] = None
+_lock = threading.Lock()
 
 
-supabase: Client = create_client(url, key)
\ No newline at end of file
+def get_supabase() -> Client:
+    """Shared sync client, created on first use rather than at import"""
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                _client = create_client(config("SUPABASE_URL"), config("SUPABASE_KEY"))
+    return _client
@@ -0,0 +1,125 @@
+# In-memory rolling time series per node, fed by the ingest pipeline
+import os
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+TIMESERIES_WINDOW_MINUTES = int(os.getenv("TIMESERIES_WINDOW_MINUTES", 15))
+# Expected report interval per node; together with the window this sizes each buffer
+TIMESERIES_SAMPLE_SECONDS = float(os.getenv("TIMESERIES_SAMPLE_SECONDS", 2))
+TIMESERIES_MAX_NODES = int(os.getenv("TIMESERIES_MAX_NODES", 2000))
+
+# Column order of the value matrix, keyed by the telemetry field names
+FIELDS = ("rssi", "latency_ms", "data_sent", "data_received", "data_total")
+# performance_metrics column for each field
+COLUMNS = {"rssi": "signal_strength", "latency_ms": "latency", "data_sent": "data_sent",
+           "data_received": "data_received", "data_total": "data_usage"}
+PERCENTILES = (50, 95, 99)
+
+
+class NodeSeries:
+    """Fixed-size ring buffer of (timestamp, FIELDS) samples for one node"""
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.values = np.full((capacity, len(FIELDS)), np.nan, dtype=np.float32)
+        self.head = 0   # next slot to write
+        self.count = 0
+
+    def append(self, ts: float, values):
+        self.timestamps[self.head] = ts
+        self.values[self.head] = values
+        self.head = (self.head + 1) % self.capacity
+        self.count = min(self.count + 1, self.capacity)
+
+    def window(self, since: float):
+        """Samples with timestamp >= since, oldest first"""
+        if self.count < self.capacity:
+            ts, vals = self.timestamps[:self.count], self.values[:self.count]
+        else:
+            order = np.roll(np.arange(self.capacity), -self.head)
+            ts, vals = self.timestamps[order], self.values[order]
+        mask = ts >= since
+        return ts[mask], vals[mask]
+
+    def nbytes(self) -> int:
+        return self.timestamps.nbytes + self.values.nbytes
+
+
+class TimeSeriesStore:
+    """Per-node ring buffers with a fixed memory budget per node"""
+
+    def __init__(
+        self,
+        window_minutes: int = TIMESERIES_WINDOW_MINUTES,
+        sample_seconds: float = TIMESERIES_SAMPLE_SECONDS,
+        max_nodes: int = TIMESERIES_MAX_NODES,
+    ):
+        self.window_seconds = window_minutes * 60
+        self.capacity = max(1, int(self.window_seconds / sample_seconds))
+        self.max_nodes = max_nodes
+        self._series: dict = {}
+        self._lock = threading.Lock()
+        self.dropped_nodes = 0
+
+    def append(self, node_id: int, reading: dict, ts: Optional[float] = None):
+        """Add one reading keyed by telemetry field names (missing -> NaN)"""
+        row = [np.nan if reading.get(f) is None else reading[f] for f in FIELDS]
+        with self._lock:
+            series = self._series.get(node_id)
+            if series is None:
+                if len(self._series) >= self.max_nodes:
+                    self.dropped_nodes += 1
+                    return
+                series = self._series[node_id] = NodeSeries(self.capacity)
+            series.append(ts if ts is not None else time.time(), row)
+
+    def append_row(self, node_id: int, row: dict, ts: Optional[float] = None):
+        """Add one performance_metrics-shaped row"""
+        self.append(node_id, {f: row.get(col) for f, col in COLUMNS.items()}, ts)
+
+    def nodes(self) -> list:
+        with self._lock:
+            return sorted(self._series)
+
+    def window(self, node_id: int, seconds: Optional[float] = None):
+        seconds = min(seconds or self.window_seconds, self.window_seconds)
+        with self._lock:
+            series = self._series.get(node_id)
+            if series is None:
+                return np.empty(0), np.empty((0, len(FIELDS)), dtype=np.float32)
+            return series.window(time.time() - seconds)
+
+    def aggregate(self, node_id: int, seconds: Optional[float] = None) -> Optional[dict]:
+        """min/max/mean/percentiles/last per field over the window"""
+        ts, vals = self.window(node_id, seconds)
+        if not ts.size:
+            return None
+
+        fields = {}
+        for i, name in enumerate(FIELDS):
+            col = vals[:, i]
+            col = col[~np.isnan(col)]
+            if not col.size:
+                fields[name] = None
+                continue
+            pct = np.percentile(col, PERCENTILES)
+            fields[name] = {
+                "last": float(col[-1]),
+                "min": float(col.min()),
+                "max": float(col.max()),
+                "mean": float(col.mean()),
+                **{f"p{p}": float(v) for p, v in zip(PERCENTILES, pct)},
+            }
+        return {"node_id": node_id, "samples": int(ts.size), "last_seen": float(ts[-1]), "fields": fields}
+
+    def memory_bytes(self) -> int:
+        with self._lock:
+            return sum(s.nbytes() for s in self._series.values())
+
+
+# Shared store fed by services.ingest and read by the dashboard
+timeseries_store = TimeSeriesStore()
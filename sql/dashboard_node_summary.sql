@@ -0,0 +1,48 @@
+-- Per-node window summary for the admin dashboard (services/metrics_queries.py
+-- calls it over PostgREST RPC for windows short enough to read raw rows).
+-- Aggregates in the database so the backend never pulls the window's rows.
+create or replace function dashboard_node_summary(
+    p_start timestamptz,
+    p_end timestamptz
+) returns table (
+    node_id bigint,
+    samples bigint,
+    last_seen timestamptz,
+    signal_strength double precision,
+    latency double precision,
+    data_usage double precision,
+    latency_avg double precision,
+    latency_p95 double precision,
+    signal_avg double precision,
+    signal_p95 double precision
+)
+language sql
+stable
+as $$
+    with windowed as (
+        select *
+        from performance_metrics m
+        where m.metric_timestamp >= p_start and m.metric_timestamp < p_end
+    ),
+    latest as (
+        select distinct on (w.node_id)
+            w.node_id, w.metric_timestamp, w.signal_strength, w.latency, w.data_usage
+        from windowed w
+        order by w.node_id, w.metric_timestamp desc
+    )
+    select
+        w.node_id,
+        count(*),
+        l.metric_timestamp,
+        l.signal_strength,
+        l.latency,
+        l.data_usage,
+        avg(w.latency),
+        percentile_disc(0.95) within group (order by w.latency),
+        avg(w.signal_strength),
+        percentile_disc(0.95) within group (order by w.signal_strength)
+    from windowed w
+    join latest l on l.node_id = w.node_id
+    group by w.node_id, l.metric_timestamp, l.signal_strength, l.latency, l.data_usage
+    order by w.node_id;
+$$;
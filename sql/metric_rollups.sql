@@ -0,0 +1,27 @@
+-- Per-node 1m/5m/1h buckets written by services/rollups.py.
+-- Each worker writes its own partial row (source); readers merge rows that
+-- share (node_id, resolution, bucket_start), sketches included.
+create table if not exists metric_rollups (
+    node_id bigint not null,
+    resolution text not null check (resolution in ('1m', '5m', '1h')),
+    bucket_start timestamptz not null,
+    source text not null,
+    samples integer not null default 0,
+    data_usage_last double precision,
+    latency_count integer not null default 0,
+    latency_sum double precision not null default 0,
+    latency_min double precision,
+    latency_max double precision,
+    latency_last double precision,
+    latency_sketch jsonb,
+    rssi_count integer not null default 0,
+    rssi_sum double precision not null default 0,
+    rssi_min double precision,
+    rssi_max double precision,
+    rssi_last double precision,
+    rssi_sketch jsonb,
+    primary key (node_id, resolution, bucket_start, source)
+);
+
+create index if not exists metric_rollups_resolution_bucket_start_idx
+    on metric_rollups (resolution, bucket_start);
@@ -0,0 +1,5 @@
+-- Idempotency key for performance_metrics. Every insert path (spool replays,
+-- the direct MQTT writer, /metrics and /metrics/bulk) upserts on it with
+-- ignore-duplicates, so a resent reading is skipped instead of failing with 409.
+create unique index if not exists performance_metrics_node_id_metric_timestamp_key
+    on performance_metrics (node_id, metric_timestamp);
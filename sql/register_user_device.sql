@@ -0,0 +1,27 @@
+-- Registration in one round trip (routes/register.py calls it over PostgREST RPC).
+-- The account and its device are created in the same transaction; a taken
+-- username raises unique_violation, which PostgREST returns as 409.
+create unique index if not exists user_accounts_username_key
+    on user_accounts (username);
+
+create or replace function register_user_device(
+    p_username text,
+    p_password_hash text,
+    p_node_id bigint,
+    p_mac_address text
+) returns bigint
+language plpgsql
+as $$
+declare
+    new_user_id bigint;
+begin
+    insert into user_accounts (username, password_hash, role, node_id)
+    values (p_username, p_password_hash, 'user', p_node_id)
+    returning user_id into new_user_id;
+
+    insert into devices (user_id, node_id, mac_address)
+    values (new_user_id, p_node_id, p_mac_address);
+
+    return new_user_id;
+end;
+$$;
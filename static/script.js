@@ -1,3 +1,21 @@
 function goTo(path) {
   window.location.href = path;
 }
+
+// Update dashboard node cards from the live metrics stream
+function startLiveMetrics(url) {
+  if (!window.EventSource) return;
+
+  const source = new EventSource(url);
+  source.onmessage = (event) => {
+    JSON.parse(event.data).forEach((metric) => {
+      const card = document.querySelector(`[data-node-id="${metric.node_id}"]`);
+      if (!card) return;
+      card.querySelectorAll('[data-field]').forEach((el) => {
+        const value = metric[el.dataset.field];
+        if (value !== undefined && value !== null) el.textContent = value;
+      });
+    });
+  };
+  return source;
+}
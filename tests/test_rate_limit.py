@@ -0,0 +1,199 @@
+import pytest
+
+from services import rate_limit
+from services.rate_limit import TokenBucketLimiter, RedisTokenBucketLimiter, make_limiter
+
+
+class FakeClock:
+    """Stands in for the time module inside services.rate_limit"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+
+class FakeRedis:
+    """Runs REDIS_TOKEN_BUCKET's logic in Python and counts round trips"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.round_trips = 0
+
+    def _bucket(self, key, rate, burst, now, cost):
+        tokens, ts = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + max(0, now - ts) * rate)
+        allowed = 0
+        if tokens >= cost:
+            tokens -= cost
+            allowed = 1
+        self.buckets[key] = (tokens, now)
+        return allowed
+
+    def eval(self, script, numkeys, key, *args):
+        self.round_trips += 1
+        return self._bucket(key, *args)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis: FakeRedis):
+        self.redis = redis
+        self.queued = []
+
+    def eval(self, script, numkeys, key, *args):
+        self.queued.append((key, args))
+
+    def execute(self):
+        self.redis.round_trips += 1
+        return [self.redis._bucket(key, *args) for key, args in self.queued]
+
+
+class DeadRedis:
+    def __init__(self):
+        self.calls = 0
+
+    def eval(self, *args):
+        self.calls += 1
+        raise ConnectionError("Redis is down")
+
+    def pipeline(self, transaction=True):
+        self.calls += 1
+        raise ConnectionError("Redis is down")
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limit, "time", clock)
+    return clock
+
+
+# ======== IN-PROCESS BUCKETS =========
+
+def test_bucket_allows_burst_then_limits(clock):
+    limiter = TokenBucketLimiter("test", rate=1, burst=3)
+    assert [limiter.allow("a") for _ in range(4)] == [True, True, True, False]
+    assert limiter.snapshot() == {"allowed": 3, "limited": 1, "sampled": 0, "keys": 1}
+
+
+def test_bucket_refills_at_rate(clock):
+    limiter = TokenBucketLimiter("test", rate=2, burst=2)
+    assert limiter.allow("a") and limiter.allow("a")
+    assert not limiter.allow("a")
+
+    clock.now += 0.5  # one token at 2/s
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+
+    clock.now += 60  # refill caps at burst
+    assert [limiter.allow("a") for _ in range(3)] == [True, True, False]
+
+
+def test_keys_have_separate_buckets(clock):
+    limiter = TokenBucketLimiter("test", rate=1, burst=1)
+    assert limiter.allow("a")
+    assert not limiter.allow("a")
+    assert limiter.allow("b")
+
+
+def test_least_recently_used_key_is_evicted(clock):
+    limiter = TokenBucketLimiter("test", rate=1, burst=1, maxsize=2)
+    limiter.allow("a")
+    limiter.allow("b")
+    limiter.allow("a")  # "a" is now the most recent
+    limiter.allow("c")  # evicts "b"
+
+    assert limiter.snapshot()["keys"] == 2
+    assert set(limiter._buckets) == {"a", "c"}
+    # An evicted key starts over with a full bucket
+    assert limiter.allow("b")
+
+
+def test_sample_every_lets_nth_limited_call_through(clock):
+    limiter = TokenBucketLimiter("test", rate=1, burst=1, sample_every=2)
+    assert [limiter.allow("a") for _ in range(5)] == [True, False, True, False, True]
+    assert limiter.snapshot()["sampled"] == 2
+
+
+def test_retry_after_rounds_up_to_whole_seconds():
+    assert TokenBucketLimiter("test", rate=0.25, burst=1).retry_after() == 4
+    assert TokenBucketLimiter("test", rate=10, burst=1).retry_after() == 1
+
+
+@pytest.mark.parametrize("rate, burst", [(0, 10), (-1, 10), (1, 0)])
+def test_make_limiter_rejects_non_positive_rate_or_burst(rate, burst):
+    with pytest.raises(ValueError):
+        make_limiter("invalid", rate, burst)
+
+
+# ======== REDIS BUCKETS =========
+
+def test_redis_allow_many_is_one_pipelined_round_trip(clock):
+    redis = FakeRedis()
+    limiter = RedisTokenBucketLimiter("test", rate=1, burst=2, client=redis)
+
+    assert limiter.allow_many(["a", "a", "a", "b"]) == [True, True, False, True]
+    assert redis.round_trips == 1
+    assert set(redis.buckets) == {"ratelimit:test:a", "ratelimit:test:b"}
+    assert limiter.snapshot()["redis_errors"] == 0
+
+
+def test_redis_buckets_are_shared_between_limiters(clock):
+    redis = FakeRedis()
+    first = RedisTokenBucketLimiter("test", rate=1, burst=1, client=redis)
+    second = RedisTokenBucketLimiter("test", rate=1, burst=1, client=redis)
+
+    assert first.allow("a")
+    assert not second.allow("a")
+    clock.now += 1
+    assert second.allow("a")
+
+
+@pytest.mark.asyncio
+async def test_redis_allow_many_async(clock):
+    redis = FakeRedis()
+    limiter = RedisTokenBucketLimiter("test", rate=1, burst=1, client=redis)
+
+    assert await limiter.allow_many_async(iter(["a", "b", "a"])) == [True, True, False]
+    assert await limiter.allow_many_async([]) == []
+    assert redis.round_trips == 1
+
+
+def test_redis_down_falls_back_to_local_buckets(clock):
+    redis = DeadRedis()
+    limiter = RedisTokenBucketLimiter("test", rate=1, burst=2, client=redis, retry_after_error=5)
+
+    assert [limiter.allow("a") for _ in range(3)] == [True, True, False]
+    assert limiter.allow_many(["b", "b", "b"]) == [True, True, False]
+    # Only the first call tried Redis; the rest ran while the circuit was open
+    assert redis.calls == 1
+    stats = limiter.snapshot()
+    assert stats["redis_errors"] == 1
+    assert stats["redis_skipped"] == 3
+
+
+def test_redis_is_retried_after_the_open_window(clock):
+    redis = DeadRedis()
+    limiter = RedisTokenBucketLimiter("test", rate=1, burst=2, client=redis, retry_after_error=5)
+    limiter.allow("a")
+
+    clock.now += 4.9
+    limiter.allow("a")
+    assert redis.calls == 1
+
+    clock.now += 0.2
+    limiter.allow("a")
+    assert redis.calls == 2
+
+    # Back up: the shared buckets are used again
+    limiter._client = FakeRedis()
+    clock.now += 5
+    assert limiter.allow("a")
+    assert limiter._client.round_trips == 1
@@ -0,0 +1,165 @@
+import time
+
+import pytest
+
+from benchmarks.fakes import FakeStore, FakeSupabase
+from services.mac_cache import MacResolver
+from services.spool import MetricsSpool
+
+
+class FlakySupabase(FakeSupabase):
+    """FakeSupabase whose next upserts fail before, or after, reaching the store"""
+
+    def __init__(self, store: FakeStore):
+        super().__init__(store)
+        self.fail_before = 0   # request never reached the database
+        self.fail_after = 0    # stored, but the response was lost
+
+    def table(self, name: str):
+        query = super().table(name)
+        execute = query.execute
+
+        def flaky_execute():
+            if self.fail_before:
+                self.fail_before -= 1
+                raise ConnectionError("Supabase unreachable")
+            result = execute()
+            if self.fail_after:
+                self.fail_after -= 1
+                raise TimeoutError("response lost")
+            return result
+
+        query.execute = flaky_execute
+        return query
+
+
+def reading(node_id: int, second: int) -> dict:
+    return {
+        "node_id": node_id,
+        "metric_timestamp": f"2026-10-18T12:00:{second:02d}+00:00",
+        "signal_strength": -60.0,
+        "latency": 12.0,
+        "data_usage": 1.0,
+    }
+
+
+@pytest.fixture
+def store():
+    store = FakeStore()
+    store.seed_nodes(3)
+    return store
+
+
+@pytest.fixture
+def client(store):
+    return FlakySupabase(store)
+
+
+@pytest.fixture
+def spool(tmp_path, client):
+    return MetricsSpool(path=str(tmp_path / "spool.db"), client=client, resolver=MacResolver(client=client), batch_size=10)
+
+
+def stored(store: FakeStore) -> list:
+    return sorted((r["node_id"], r["metric_timestamp"]) for r in store.table("performance_metrics"))
+
+
+def test_drain_upserts_rows_and_empties_the_spool(spool, store):
+    spool.append_many([reading(1, 0), reading(2, 0)])
+    assert spool.depth() == 2
+
+    assert spool.drain_once() == 2
+    assert spool.depth() == 0
+    assert stored(store) == [(1, "2026-10-18T12:00:00+00:00"), (2, "2026-10-18T12:00:00+00:00")]
+
+
+def test_drain_sends_oldest_batch_first(spool, store):
+    spool.append_many([reading(1, second) for second in range(15)])
+
+    assert spool.drain_once() == 10
+    assert [ts for _, ts in stored(store)] == [f"2026-10-18T12:00:{s:02d}+00:00" for s in range(10)]
+    assert spool.drain_once() == 5
+    assert spool.depth() == 0
+
+
+def test_failed_drain_keeps_rows_for_replay(spool, client, store):
+    spool.append_many([reading(1, 0), reading(2, 0)])
+    client.fail_before = 1
+
+    with pytest.raises(ConnectionError):
+        spool.drain_once()
+    assert spool.depth() == 2
+    assert stored(store) == []
+
+    assert spool.drain_once() == 2
+    assert spool.depth() == 0
+    assert len(stored(store)) == 2
+
+
+def test_replaying_an_unacknowledged_batch_is_duplicate_safe(spool, client, store):
+    spool.append_many([reading(1, 0), reading(2, 0)])
+    client.fail_after = 1
+
+    # Stored, but the drainer never saw the response, so the rows stay spooled
+    with pytest.raises(TimeoutError):
+        spool.drain_once()
+    assert spool.depth() == 2
+    assert len(stored(store)) == 2
+
+    # The replay upserts on node_id,metric_timestamp and skips what's already there
+    assert spool.drain_once() == 2
+    assert spool.depth() == 0
+    assert len(stored(store)) == 2
+
+
+def test_resent_reading_does_not_overwrite_the_stored_one(spool, store):
+    spool.append_many([reading(1, 0)])
+    spool.drain_once()
+
+    spool.append_many([{**reading(1, 0), "latency": 99.0}])
+    spool.drain_once()
+
+    rows = store.table("performance_metrics")
+    assert len(rows) == 1
+    assert rows[0]["latency"] == 12.0
+
+
+def test_rows_survive_stop_and_restart(tmp_path, store, client):
+    path = str(tmp_path / "spool.db")
+    spool = MetricsSpool(path=path, client=client, resolver=MacResolver(client=client))
+    spool.append_many([reading(1, 0), reading(2, 0), reading(3, 0)])
+
+    # The final drain in stop() fails, so the rows stay on disk
+    client.fail_before = 1
+    spool.stop()
+    assert spool.depth() == 3
+
+    restarted = MetricsSpool(path=path, client=client, resolver=MacResolver(client=client), drain_interval=0.01)
+    assert restarted.depth() == 3
+    restarted.start()
+    try:
+        deadline = time.monotonic() + 5
+        while restarted.depth() and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        restarted.stop()
+    assert restarted.depth() == 0
+    assert [node_id for node_id, _ in stored(store)] == [1, 2, 3]
+
+
+def test_rows_spooled_by_mac_are_resolved_when_drained(spool, client, store):
+    mac = store.table("node")[1]["mac_address"]
+    unresolved = {k: v for k, v in reading(0, 0).items() if k != "node_id"}
+    spool.append_many([{**unresolved, "mac": mac.lower()}, {**unresolved, "mac": "AA:BB:CC:DD:EE:FF"}])
+
+    # The node lookup is down too; rows wait on disk
+    client.fail_before = 1
+    with pytest.raises(ConnectionError):
+        spool.drain_once()
+    assert spool.depth() == 2
+
+    assert spool.drain_once() == 2
+    assert spool.depth() == 0
+    rows = store.table("performance_metrics")
+    assert [(r["node_id"], "mac" in r) for r in rows] == [(2, False)]
+    assert spool.stats["unknown_mac"] == 1